@@ -18,7 +18,7 @@ HOW THIS WORKS
         This variable may or may not change.
 
     The protocol for sending hashes is
-        client.send("/mine " + <string>, False).
+        client.send("/mine " + <string>).
     You should check your hashes with the following function:
             hashlib.sha512(<string>).hexdigest()
         to check if it contains an adequate amount of leading zeroes
@@ -37,10 +37,243 @@ HOW THIS WORKS
         earning coins can let you buy things, described in other
         documents.
 
+================================================================
+THE MINING ENGINE
+    mine() below now starts a MiningEngine, which runs the search in
+        several processes (threads would all share one core because
+        of the GIL). Each worker searches its own slice of the nonce
+        space, so no two workers ever try the same string. When the
+        server announces a new hash, the client calls new_hash() and
+        every worker starts over on it within a few milliseconds.
+    The workers don't rebuild and rehash the whole string for every
+        try. The start of the nonce stays the same for a long time, so
+        it's hashed once and the sha512 object is copied; only the last
+        two characters and the previous hash are hashed per try, and
+        the raw digest is compared against a bound instead of counting
+        zeros in hexdigest().
+    Only the first winning string per hash is sent to the server.
+    Set "miningWorkers" in data.json to choose how many processes to
+        use, or to 0 to turn mining off.
+
 Have fun!
 """
 
 import hashlib
+import multiprocessing
+import os
+import queue
+import secrets
+import string
+import threading
+import time
+
+import metrics
+
+NONCE_LENGTH = 86
+ALPHABET = string.ascii_letters + string.digits
+# Nonces end in one of these two-character tails. A "batch" is every
+#     tail with the rest of the nonce fixed, which is how many hashes a
+#     worker tries between checks for a new hash.
+TAILS = [(a + b).encode() for a in ALPHABET for b in ALPHABET]
+# The counter before the tail gets this many characters.
+MIDDLE_LENGTH = 6
+# Seconds between hash rate samples.
+RATE_INTERVAL = 5
+
+
+def encode(number, width):
+    """
+    encode(number, width) -> str
+    Writes a number in ALPHABET digits, padded to the given width.
+    """
+    digits = []
+    base = len(ALPHABET)
+    for _ in range(width):
+        number, digit = divmod(number, base)
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def zero_bound(zeros):
+    """
+    zero_bound(zeros) -> bytes
+    A raw sha512 digest starts with (at least) that many zeros in hex
+        exactly when it compares less than this. No hexdigest() needed.
+    """
+    if zeros == 0:
+        # Longer than any digest, and bigger than all of them.
+        return b"\xff" * 65
+    return (1 << (512 - 4 * zeros)).to_bytes(64, "big")
+
+
+def scan(middle, tails, bound):
+    """
+    scan(middle, tails, bound) -> int
+    Tries one batch. middle is a sha512 object that has already eaten
+        everything in the nonce before the tail; tails is TAILS with the
+        previous hash already stuck on the end of each one.
+    Returns the index of the winning tail, or -1.
+    """
+    copy = middle.copy
+    for i, tail in enumerate(tails):
+        h = copy()
+        h.update(tail)
+        if h.digest() < bound:
+            return i
+    return -1
+
+
+def search(worker, salt, prev_hash, generation, zeros, results, stop, counts):
+    """
+    search(worker, salt, prev_hash, generation, zeros, results, stop, counts)
+    The worker process. Nonces look like
+        [worker number][salt][block][middle][tail],
+    so every worker has its own slice of the nonce space.
+    Everything before the middle is hashed once per block, the middle
+        once per batch, and only the tail (plus the previous hash) once
+        per candidate.
+    Hits are put on results as (generation, nonce).
+    counts[worker] is how many hashes we've tried, for the hash rate.
+    """
+    head = encode(worker, 2) + salt
+    block_width = NONCE_LENGTH - len(head) - MIDDLE_LENGTH - 2
+    while not stop.is_set():
+        current = generation.value
+        prev = prev_hash.value
+        bound = zero_bound(zeros.value)
+        tails = [tail + prev for tail in TAILS]
+        block = 0
+        while generation.value == current and not stop.is_set():
+            prefix = head + encode(block, block_width)
+            base = hashlib.sha512(prefix.encode())
+            block += 1
+            for number in range(len(ALPHABET) ** MIDDLE_LENGTH):
+                if generation.value != current or stop.is_set():
+                    break
+                middle = encode(number, MIDDLE_LENGTH)
+                state = base.copy()
+                state.update(middle.encode())
+                found = scan(state, tails, bound)
+                counts[worker] += len(tails)
+                if found != -1:
+                    results.put(
+                        (current, prefix + middle + TAILS[found].decode()))
+
+
+class MiningEngine:
+    """
+    Runs search() in a pool of processes and sends the winners.
+    """
+
+    def __init__(self, client, workers=None):
+        """
+        MiningEngine.__init__(client, workers=None) -> MiningEngine
+        workers is the number of processes; by default, one per core
+            but one, so the chatroom itself still gets some CPU.
+        """
+        self.client = client
+        self.workers = workers or max((os.cpu_count() or 2) - 1, 1)
+        # spawn, because forking a process full of Tk and threads is asking for trouble.
+        self.context = multiprocessing.get_context("spawn")
+        self.prev_hash = self.context.Array("c", 256)
+        self.generation = self.context.Value("i", 0)
+        self.zeros = self.context.Value("i", 0)
+        self.results = self.context.Queue()
+        self.stop_event = self.context.Event()
+        # Hashes tried by each worker. Nobody else writes a worker's
+        #     slot, so no lock.
+        self.counts = self.context.Array("Q", self.workers, lock=False)
+        # Hashes per second over the last RATE_INTERVAL, kept up to date
+        #     by sample(), so it's the same no matter who looks or how often.
+        self.rate = 0.0
+        self.processes = []
+        # The generation we've already sent a winner for.
+        self.submitted = -1
+
+    def start(self):
+        """
+        MiningEngine.start()
+        Starts the workers, and a thread that collects their hits.
+        """
+        self.new_hash(self.client.prev_hash, self.client.hash_zeros)
+        salt = secrets.token_hex(8)
+        for worker in range(self.workers):
+            process = self.context.Process(
+                target=search, daemon=True, name=f"miner-{worker}",
+                args=(
+                    worker, salt, self.prev_hash, self.generation,
+                    self.zeros, self.results, self.stop_event, self.counts
+                )
+            )
+            process.start()
+            self.processes.append(process)
+        threading.Thread(target=self.collect, name="miner-results", daemon=True).start()
+        threading.Thread(target=self.sample, name="miner-rate", daemon=True).start()
+        metrics.gauge("mining_hashes", self.hashes)
+        metrics.gauge("mining_hash_rate", self.hash_rate)
+
+    def hashes(self):
+        """
+        MiningEngine.hashes() -> int
+        Hashes tried so far, by all the workers.
+        """
+        return sum(self.counts)
+
+    def hash_rate(self):
+        """
+        MiningEngine.hash_rate() -> float
+        Hashes per second, over the last RATE_INTERVAL seconds.
+        """
+        return self.rate
+
+    def sample(self):
+        """
+        MiningEngine.sample()
+        Works out the hash rate every RATE_INTERVAL seconds, until stopped.
+        """
+        then, before = time.perf_counter(), self.hashes()
+        while not self.stop_event.wait(RATE_INTERVAL):
+            now, total = time.perf_counter(), self.hashes()
+            self.rate = (total - before) / (now - then)
+            then, before = now, total
+
+    def new_hash(self, prev_hash, zeros=None):
+        """
+        MiningEngine.new_hash(prev_hash, zeros=None)
+        Tells the workers to drop what they're doing and mine on prev_hash.
+        """
+        with self.generation.get_lock():
+            self.prev_hash.value = prev_hash.encode()
+            if zeros is not None:
+                self.zeros.value = zeros
+            self.generation.value += 1
+
+    def collect(self):
+        """
+        MiningEngine.collect()
+        Sends the first hit for each hash to the server, ignores the rest.
+        """
+        while not self.stop_event.is_set():
+            try:
+                found, nonce = self.results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if found != self.generation.value or found == self.submitted:
+                # Stale, or somebody else in the pool already won this one.
+                continue
+            self.submitted = found
+            self.client.send(f"/mine {nonce}")
+
+    def stop(self):
+        """
+        MiningEngine.stop()
+        Stops all the workers.
+        """
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
 
 
 def mine(client):
@@ -49,4 +282,8 @@ def mine(client):
     Edit this function to mine coins.
     Instructions are included with this file.
     """
-    pass
+    workers = client.data.get("miningWorkers")
+    if workers == 0:
+        return
+    client.miner = MiningEngine(client, workers)
+    client.miner.start()
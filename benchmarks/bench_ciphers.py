@@ -0,0 +1,49 @@
+"""
+bench_ciphers.py
+Python Chatroom
+
+Compares the AES-CTR backends in encryption.py over a range of message
+    sizes. Run it from anywhere:
+        python benchmarks/bench_ciphers.py
+Only backends that are installed show up. pyaes is always there.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encryption
+
+SIZES = (16, 256, 4096, 65536)
+
+
+def bench(backend, size, seconds=0.5):
+    """
+    bench(backend, size, seconds=0.5) -> float
+    Encrypts size-byte messages for about the given time.
+    Returns throughput in KB/s.
+    """
+    key = os.urandom(encryption.KEY_LENGTH)
+    data = os.urandom(size)
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        backend.ctr(key, encryption.DEFAULT_COUNTER, data)
+        done += size
+    return done / (time.perf_counter() - start) / 1024
+
+
+def main():
+    backends = encryption.available_backends()
+    print("size".rjust(8), *(b.name.rjust(14) for b in backends), sep="")
+    for size in SIZES:
+        print(
+            str(size).rjust(8),
+            *(f"{bench(b, size):10.0f} KB/s" for b in backends), sep=""
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+bench_e2e.py
+Python Chatroom
+
+End-to-end numbers for the whole client, against local_server.py:
+    - messages received per second, with N headless clients chatting
+    - encrypting and decrypting one frame
+    - /ping round trips (p50 and p99)
+    - how much memory chat history takes as it grows
+    - ClientUI.insert per message (skipped without a display)
+Everything goes out as JSON, so runs from different versions can be
+    compared. Run it with:
+        python benchmarks/bench_e2e.py --clients 8 --out results.json
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rsa
+
+import chat_client
+import connection
+import encryption
+import history
+import local_server
+import messages
+
+MESSAGE = "The quick brown fox jumps over the lazy dog. " * 2
+
+
+def percentile(values, fraction):
+    """
+    percentile(values, fraction) -> float
+    Nearest-rank percentile of a list of numbers.
+    """
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def start_server(session):
+    """
+    start_server(session) -> LocalServer
+    Runs a LocalServer on its own thread and event loop, so it doesn't
+        share one with the clients.
+    """
+    server = local_server.LocalServer(port=0, session=session)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="bench-server", daemon=True).start()
+    ready.wait()
+    return server
+
+
+def bench_crypto(count=2000):
+    """
+    bench_crypto(count=2000) -> dict
+    Microseconds to encrypt and decrypt one frame, both kinds.
+    """
+    public_key, private_key = rsa.newkeys(256)
+    session = encryption.Session()
+    results = {}
+    for name, encrypt, decrypt in (
+        ("rsa", lambda: encryption.encrypt(MESSAGE, public_key),
+         lambda frame: encryption.decrypt(frame, private_key)),
+        ("session", lambda: session.encrypt(MESSAGE), session.decrypt),
+    ):
+        frames = []
+        start = time.perf_counter()
+        for _ in range(count):
+            frames.append(encrypt())
+        middle = time.perf_counter()
+        for frame in frames:
+            decrypt(frame)
+        end = time.perf_counter()
+        results[name] = {
+            "encrypt_us": (middle - start) / count * 1e6,
+            "decrypt_us": (end - middle) / count * 1e6,
+        }
+    return results
+
+
+def bench_throughput(port, clients, messages, timeout=60):
+    """
+    bench_throughput(port, clients, messages, timeout=60) -> dict
+    Every client sends messages lines. The server sends each one to every
+        client, so clients * clients * messages should come back.
+    """
+    received = [0]
+    done = threading.Event()
+    expected = clients * clients * messages
+
+    def count(event, *args):
+        if event == "message" and args[0].text == MESSAGE:
+            received[0] += 1
+            if received[0] >= expected:
+                done.set()
+
+    bots = []
+    for number in range(clients):
+        bot = chat_client.ChatClient(port)
+        bot.add_listener(count)
+        if not connection.run(
+                bot.login("127.0.0.1", f"bench{number}", "bench"), 30):
+            raise RuntimeError("Couldn't log in to the local server.")
+        bots.append(bot)
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        for bot in bots:
+            bot.send(MESSAGE)
+    done.wait(timeout)
+    elapsed = time.perf_counter() - start
+
+    for bot in bots:
+        bot.close()
+    return {
+        "clients": clients,
+        "sent": clients * messages,
+        "received": received[0],
+        "expected": expected,
+        "seconds": elapsed,
+        "messages_per_sec": received[0] / elapsed,
+    }
+
+
+def bench_ping(port, count):
+    """
+    bench_ping(port, count) -> dict
+    One /ping at a time, timed from send() to the "ping" event.
+    """
+    answered = threading.Event()
+    bot = chat_client.ChatClient(port)
+    bot.add_listener(lambda event, *args: event == "ping" and answered.set())
+    connection.run(bot.login("127.0.0.1", "pinger", "bench"), 30)
+
+    times = []
+    for _ in range(count):
+        answered.clear()
+        start = time.perf_counter()
+        bot.send("/ping")
+        if answered.wait(5):
+            times.append((time.perf_counter() - start) * 1000)
+    bot.close()
+    if not times:
+        return {"count": 0}
+    return {
+        "count": len(times),
+        "p50_ms": percentile(times, 0.5),
+        "p99_ms": percentile(times, 0.99),
+        "max_ms": max(times),
+    }
+
+
+def bench_history(records, cap=2000):
+    """
+    bench_history(records, cap=2000) -> dict
+    Memory held by one ChatHistory after every tenth of records.
+    """
+    growth = []
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        store = history.ChatHistory(os.path.join(directory, "bench.jsonl"), cap)
+        step = max(records // 10, 1)
+        for number in range(1, records + 1):
+            store.append(messages.ChatRecord("someone", f"{MESSAGE}{number}"))
+            if number % step == 0:
+                growth.append(
+                    {"records": number,
+                     "bytes": tracemalloc.get_traced_memory()[0] - base})
+        tracemalloc.stop()
+        store.close()
+    return {"cap": cap, "growth": growth}
+
+
+def bench_ui(count):
+    """
+    bench_ui(count) -> dict
+    Microseconds per ClientUI.insert, drawing included.
+    Returns {"skipped": reason} if there's no display.
+    """
+    import tkinter as tk
+
+    import client_ui
+
+    class Master(tk.Tk):
+        # Just enough of client.Client for ClientUI.
+        data = copy.deepcopy(chat_client.DEFAULT_DATA)
+        username = "bench"
+        local_ip = "127.0.0.1"
+
+        def login(self, event=None):
+            pass
+
+        make_account = send = login
+
+        def save_data(self):
+            pass
+
+    try:
+        master = Master()
+    except tk.TclError as e:
+        return {"skipped": str(e)}
+
+    # History spills into the UI's own temporary directory.
+    ui = client_ui.ClientUI(master)
+    ui.configure_login()
+    ui.configure_chatroom()
+    master.update()
+
+    start = time.perf_counter()
+    for number in range(count):
+        ui.insert(f"someone> {MESSAGE}{number}")
+        master.update_idletasks()
+    elapsed = time.perf_counter() - start
+
+    ui.close_histories()
+    ui.history_tmp.cleanup()
+    master.destroy()
+    return {"count": count, "insert_us": elapsed / count * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end client benchmarks against local_server.py.")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200,
+                        help="messages each client sends")
+    parser.add_argument("--pings", type=int, default=200)
+    parser.add_argument("--history", type=int, default=50000,
+                        help="records to put in the history")
+    parser.add_argument("--ui", type=int, default=2000,
+                        help="messages to insert into the UI")
+    parser.add_argument("--no-session", action="store_true",
+                        help="use per-message RSA frames")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    server = start_server(not args.no_session)
+    results = {
+        "version": chat_client.DEFAULT_DATA["version"],
+        "time": time.time(),
+        "python": platform.python_version(),
+        "aes_backend": encryption.backend.name,
+        "session": not args.no_session,
+        "crypto": bench_crypto(),
+        "throughput": bench_throughput(server.port, args.clients, args.messages),
+        "ping": bench_ping(server.port, args.pings),
+        "history": bench_history(args.history),
+        "ui": bench_ui(args.ui),
+    }
+
+    text = json.dumps(results, indent=4)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+bench_mining.py
+Python Chatroom
+
+How many hashes per second one mining process manages, three ways:
+    the loop Mining.search used to be (encode the whole 68-digit counter
+    for every try, hash the string, check hexdigest()), the same loop
+    with the nonce built from a fixed prefix plus a two-character tail,
+    and what Mining.search does now (hash the fixed prefix once, copy it
+    for every try, compare raw digests).
+The second is the fair baseline: the prefix is shorter than one sha512
+    block, so copying the hash state saves no hashing, and nearly all of
+    the difference to the first is just not formatting the counter.
+Run it with:
+    python benchmarks/bench_mining.py
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Mining
+
+PREV_HASH = hashlib.sha512(b"genesis").hexdigest()
+# More zeros than we'll ever find, so nothing stops early.
+ZEROS = 40
+
+
+def original(seconds):
+    """
+    original(seconds) -> float
+    Mining.search before the prefix change. Returns hashes per second.
+    """
+    target = "0" * ZEROS
+    head = Mining.encode(0, 2) + "0" * 16
+    width = Mining.NONCE_LENGTH - len(head)
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for counter in range(done, done + len(Mining.TAILS)):
+            nonce = head + Mining.encode(counter, width)
+            hashlib.sha512((nonce + PREV_HASH).encode()).hexdigest().startswith(target)
+        done += len(Mining.TAILS)
+    return done / (time.perf_counter() - start)
+
+
+def naive(seconds):
+    """
+    naive(seconds) -> float
+    Fixed prefix plus tail, still hashing the whole string and checking
+        hexdigest(). Returns hashes per second.
+    """
+    target = "0" * ZEROS
+    prefix = Mining.encode(0, 2) + "0" * (Mining.NONCE_LENGTH - 4)
+    tails = [tail.decode() + PREV_HASH for tail in Mining.TAILS]
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for tail in tails:
+            hashlib.sha512((prefix + tail).encode()).hexdigest().startswith(target)
+        done += len(tails)
+    return done / (time.perf_counter() - start)
+
+
+def prefixed(seconds):
+    """
+    prefixed(seconds) -> float
+    What Mining.search does. Returns hashes per second.
+    """
+    bound = Mining.zero_bound(ZEROS)
+    tails = [tail + PREV_HASH.encode() for tail in Mining.TAILS]
+    prefix = Mining.encode(0, 2) + "0" * (Mining.NONCE_LENGTH - Mining.MIDDLE_LENGTH - 4)
+    base = hashlib.sha512(prefix.encode())
+    done = 0
+    number = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        state = base.copy()
+        state.update(Mining.encode(number, Mining.MIDDLE_LENGTH).encode())
+        Mining.scan(state, tails, bound)
+        number += 1
+        done += len(tails)
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    before = original(3)
+    old = naive(3)
+    new = prefixed(3)
+    print(f"old Mining.search:        {before:12,.0f} hashes/s")
+    print(f"whole string, hexdigest:  {old:12,.0f} hashes/s")
+    print(f"prefix copy, raw digest:  {new:12,.0f} hashes/s")
+    print(f"speedup: {new / old:.2f}x ({new / before:.2f}x over the old loop)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+bench_records.py
+Python Chatroom
+
+How many bytes one shown message costs, the old way (a tuple of
+    username, message, str(datetime.now()) and a color, with a fresh
+    username string for every line, like parsing makes) against a
+    messages.ChatRecord (interned username, whole-second int time, Kind).
+The message text is the same both ways, so it's counted separately.
+Run it with:
+    python benchmarks/bench_records.py [count]
+"""
+
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import messages
+
+USERS = [f"user{number}" for number in range(50)]
+
+
+def lines(count):
+    """
+    lines(count) -> list
+    count server lines from a few people, as the network would hand them over.
+    """
+    return [
+        f"{USERS[number % len(USERS)]}> message number {number} says hello"
+        for number in range(count)
+    ]
+
+
+def measure(build, raw):
+    """
+    measure(build, raw) -> int
+    Bytes still held after build(raw), not counting raw itself.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(raw)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def old_records(raw):
+    kept = []
+    for line in raw:
+        username, _, text = line.partition("> ")
+        kept.append((username, text, str(datetime.datetime.now()), None))
+    return kept
+
+
+def new_records(raw):
+    kept = []
+    for line in raw:
+        username, _, text = line.partition("> ")
+        kept.append(messages.ChatRecord(username, text, messages.Kind.CHAT, time.time()))
+    return kept
+
+
+def texts_only(raw):
+    return [line.partition("> ")[2] for line in raw]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    raw = lines(count)
+    text = measure(texts_only, raw)
+    old = measure(old_records, raw) - text
+    new = measure(new_records, raw) - text
+    print(f"{count} messages, not counting the message text:")
+    print(f"tuple with str timestamp: {old / count:6.1f} bytes/message")
+    print(f"ChatRecord:               {new / count:6.1f} bytes/message")
+    print(f"saved: {(old - new) / count:.1f} bytes/message ({1 - new / old:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,774 @@
+"""
+chat_client.py
+Python Chatroom
+
+The chatroom client without any windows.
+ChatClient does the protocol, the encryption and keeps track of state
+    (balance, mining hash, etc.). It doesn't know tkinter exists: it
+    tells whoever is interested what happened through events, either
+    with callbacks (add_listener) or with an async iterator (events).
+client.py puts a window on top of this. Bots can use it directly, as
+    many as they like in one process, no display needed:
+
+    bot = ChatClient()
+    if connection.run(bot.login("127.0.0.1", "robot", "hunter22")):
+        bot.send("beep boop")
+
+Every line from the server is parsed once, into a messages.Message, and
+    handed to the handlers registered for its kind (see register).
+    Those update our state and send events.
+
+EVENTS
+    Every event is a tuple, the first item is its name:
+        ("logged_in",)
+        ("login_failed", reason)
+        ("message", record)            a messages.Message to show in a chat
+        ("balance", amount)            our balance changed by amount
+        ("cookies", amount)
+        ("new_hash", prev_hash)
+        ("leaderboard", changed)       the board was updated; changed is the
+                                           (low, high) positions that moved
+        ("ping", delay)                in seconds
+        ("delacc_error", message)
+        ("changepass_error", message)
+        ("password_changed",)
+        ("kicked", line)
+        ("connection_lost", error)     dropped, but we'll try to reconnect
+        ("reconnecting", attempt, wait)
+        ("reconnected",)
+        ("disconnected", error)        for good; error is None if we hung up
+"""
+
+import asyncio
+import collections
+import copy
+import hashlib
+import os
+import socket
+import threading
+import _thread
+import time
+import weakref
+from datetime import datetime
+
+import rsa
+
+import connection
+import datastore
+import encryption
+import framing
+import keystore
+import latency
+import leaderboard
+import message_store
+import messages
+import metrics
+import Mining
+import reconnector
+
+DEFAULT_DATA = {
+    "version": "v5.0.5", "agreedToTaC": True, "fontSize": 11,
+    "notifications": False, "loginInfo": ["", "", ""],
+    "money": 0, "cookies": 0, "keyRotationDays": None,
+    "miningWorkers": None, "sendWindowMs": 5, "pingInterval": 5,
+    "metricsPort": None, "metricsFile": None,
+    "leaderboardTTL": 60, "leaderboardRefresh": 120,
+    "messageDb": None, "reloadMessages": 100
+}
+# Every ChatClient, for the send_queue gauge. Weak, so the gauge never
+#     keeps a finished client around.
+_clients = weakref.WeakSet()
+
+
+def load_data(path):
+    """
+    load_data(path) -> dict
+    Reads data.json, making it first if it isn't there.
+    """
+    return datastore.load(path, DEFAULT_DATA)
+
+
+def send_queue():
+    """
+    send_queue() -> int
+    Messages waiting for send() to flush them, over every client.
+    """
+    return sum(len(client.outgoing) for client in list(_clients))
+
+
+metrics.gauge("send_queue", send_queue)
+
+
+class ChatClient:
+    """
+    One connection to the chatroom, with no UI.
+    Everything network-related runs on the shared event loop (see
+        connection.py), and so do listeners.
+    """
+    # How much to ask for per recv() call. Big, so busy rooms drain quickly.
+    recv_size = 1 << 18
+    # Most plaintext bytes to put in one frame when merging sends.
+    max_frame = 1 << 16
+    # Most messages to hold on to while reconnecting.
+    backlog = 1000
+
+    def __init__(self, port=1235, data_path=None, keys=None, mine=False, reconnect=False, message_db=None):
+        """
+        ChatClient.__init__(port=1235, data_path=None, keys=None, mine=False, reconnect=False, message_db=None) -> ChatClient
+        data_path is a data.json to load and save. Without one, settings
+            and balances only live in memory.
+        keys is a (public, private) RSA keypair. Without one, we use the
+            keystore next to data_path, or make a new pair.
+        mine says whether to start Mining.mine after logging in.
+        reconnect says whether to log back in by ourselves if the
+            connection drops (see reconnector.py).
+        message_db is a SQLite file to keep chat messages in (see
+            message_store.py). Without one, we use "messageDb" from the
+            data, and if that's not set either, messages aren't kept.
+        """
+        self.port = port
+        self.data_path = data_path
+        self.data = load_data(data_path) if data_path else copy.deepcopy(DEFAULT_DATA)
+        self.store = datastore.DataStore(data_path, self.data) if data_path else None
+        self.mine = mine
+        message_db = message_db or self.data.get("messageDb")
+        self.message_store = message_store.MessageStore(message_db) if message_db else None
+
+        if keys is None:
+            # Our keys live next to data.json so we don't make new ones every time.
+            if data_path:
+                rotation = self.data.get("keyRotationDays")
+                keys = keystore.KeyStore(
+                    os.path.join(os.path.dirname(data_path), "keys.json"),
+                    rotate_after=rotation * 86400 if rotation else None
+                ).load()
+            else:
+                keys = rsa.newkeys(256)
+        self.public_key, self.private_key = keys
+
+        # Attributes.
+        self.username = ""
+        self.dead = False
+        self.key_length = encryption.KEY_LENGTH
+        self.rsa_key_length = encryption.RSA_KEY_LENGTH
+        self.server_key = None
+        # Set at login if the server agrees to session frames.
+        self.session = None
+        # Mining.mine sets this if it starts a MiningEngine.
+        self.miner = None
+        self.prev_hash = ""
+        self.hash_zeros = 0
+        # Everybody's coins, sorted, and when to ask for them. See leaderboard.py.
+        self.leaderboard = leaderboard.Leaderboard()
+        self.leaderboard_cache = leaderboard.LeaderboardCache(
+            self, self.data.get("leaderboardTTL", 60),
+            self.data.get("leaderboardRefresh", 120)
+        )
+        # (ip, username, password hash) of the last login that worked.
+        self.last_login = None
+        # The hash sent with /changepass, until the server says it worked.
+        self.new_password = None
+        self.reconnector = reconnector.Reconnector(self) if reconnect else None
+
+        # Socket stuff.
+        self.pingTime = time.time()
+        self.delay = 0
+        # Looked up on the first connect; DNS can be slow, and this might
+        #     be made on the event loop (see sessions.py).
+        self.local_ip = None
+        self.conn = None
+
+        self.listeners = []
+        self.queues = []
+
+        # Message kind -> handlers, in order. See register.
+        self.handlers = {}
+        self.register(messages.CHAT, self.on_chat)
+        self.register(messages.WHISPER, self.on_chat)
+        self.register(messages.ERROR, self.on_error)
+        self.register(messages.KICKED, self.on_kicked)
+        self.register(messages.BALANCE, self.on_balance)
+        self.register(messages.COOKIES, self.on_cookies)
+        self.register(messages.NEW_HASH, self.on_new_hash)
+        self.register(messages.LEADERBOARD, self.on_leaderboard)
+        self.register(messages.PING, self.on_ping)
+
+        # Pings the server in the background once we're in. See latency.py.
+        interval = self.data.get("pingInterval", 5)
+        self.latency = latency.LatencyMonitor(self, interval) if interval else None
+
+        # Outgoing messages wait here for a moment, so a burst of them
+        #     can go out as one frame (see send).
+        self.send_window = self.data.get("sendWindowMs", 5) / 1000
+        self.outgoing = collections.deque()
+        self.outgoing_lock = threading.Lock()
+        self.flush_pending = False
+        # time.monotonic() of the last flush, to tell bursts from typing.
+        self.last_flush = 0.0
+        _clients.add(self)
+        self.decrypt_failures = metrics.counter("decrypt_failures")
+
+    def add_listener(self, listener):
+        """
+        ChatClient.add_listener(listener)
+        listener(name, *args) gets called for every event, on the event loop.
+        Don't do anything slow in there.
+        """
+        self.listeners.append(listener)
+
+    async def events(self):
+        """
+        ChatClient.events()
+        Async iterator over events, from now until we disconnect:
+            async for event in client.events(): ...
+        """
+        queue = asyncio.Queue()
+        self.queues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event[0] == "disconnected":
+                    return
+        finally:
+            self.queues.remove(queue)
+
+    def emit(self, *event):
+        """
+        ChatClient.emit(*event)
+        Tells every listener and iterator about an event.
+        """
+        for listener in self.listeners:
+            try:
+                listener(*event)
+            except Exception as e:
+                print(f"Listener failed on {event[0]}: {e}")
+        for queue in self.queues:
+            queue.put_nowait(event)
+
+    async def login(self, ip, username, password, resume=False, hashed=False):
+        """
+        ChatClient.login(ip, username, password, resume=False, hashed=False) -> bool
+        Logs in and starts listening. Returns whether it worked.
+        resume is for logging back in after the connection dropped:
+            "reconnected" instead of "logged_in", and no "login_failed".
+        hashed means password is already what the server wants (like
+            last_login has), not what the user typed.
+        """
+        if not hashed:
+            password = hashlib.sha512((password + username).encode()).hexdigest()
+        login = (ip, username, password)
+        credentials = "\n".join(
+            (str(self.public_key.n), str(self.public_key.e), username, password))
+
+        print(
+            f"Attempting login at server with IP {ip}, {str(datetime.now())[:-7]}",
+            end="... "
+        )
+        try:
+            server_key = await self.connect(ip, credentials)
+        except OSError:
+            print("Failed to connect. ")
+            if not resume:
+                self.emit("login_failed", "Failed to connect. Please check your IP. ")
+            return False
+
+        self.username = username
+
+        # The server's public key should have come back.
+        try:
+            self.read_server_key(server_key)
+
+        except:
+            # Probably denied access.
+            print("Login failed. ")
+            await self.conn.close()
+            if not resume:
+                self.emit(
+                    "login_failed", "Incorrect username or password. Please try again. ")
+            return False
+
+        print()
+        if not resume:
+            self.start_jobs()
+            self.emit("logged_in")
+        if not await self.main_loop():
+            return False
+        self.last_login = login
+        if resume:
+            self.emit("reconnected")
+        return True
+
+    def start_jobs(self):
+        """
+        ChatClient.start_jobs()
+        Starts what runs in the background while we're logged in.
+        close() stops it all again, unless we're only reconnecting.
+        """
+        if self.latency is not None:
+            self.latency.start()
+        self.leaderboard_cache.start()
+
+    def stop_jobs(self):
+        """
+        ChatClient.stop_jobs()
+        Stops what start_jobs() started. Safe from any thread.
+        """
+        if self.latency is not None:
+            self.latency.stop()
+        self.leaderboard_cache.stop()
+
+    async def make_account(self, ip, username, password):
+        """
+        ChatClient.make_account(ip, username, password) -> bool
+        Makes a new account, which also logs us in. Returns whether it worked.
+        """
+        credentials = f"{self.public_key.n}\n{self.public_key.e}\n"
+        credentials += f"{username}\n"
+        password = hashlib.sha512((password + username).encode()).hexdigest()
+        credentials += f"{password}\nnewacc"
+        try:
+            message = await self.connect(ip, credentials)
+        except OSError:
+            self.emit("login_failed", "Failed to connect. Please check your IP. ")
+            return False
+
+        try:
+            self.read_server_key(message)
+
+        except:
+            # I dunno! Let the server tell us.
+            try:
+                message = self.decrypt(await self.conn.read_frame(message))
+            except ConnectionError:
+                message = "The server closed the connection. "
+            await self.conn.close()
+            self.emit("login_failed", message)
+            return False
+
+        # Start recieving messages.
+        self.username = username
+        self.start_jobs()
+        self.emit("logged_in")
+        if not await self.main_loop():
+            return False
+        self.last_login = (ip, username, password)
+        return True
+
+    @staticmethod
+    async def find_local_ip():
+        """
+        ChatClient.find_local_ip() -> str
+        Our IP address, looked up without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            found = await loop.getaddrinfo(socket.gethostname(), None, family=socket.AF_INET)
+        except OSError:
+            return "127.0.0.1"
+        return found[0][4][0]
+
+    async def connect(self, ip, credentials):
+        """
+        ChatClient.connect(ip, credentials) -> bytes
+        Opens a new connection, sends our credentials in plaintext and
+            returns the server's first answer.
+        Raises OSError if we can't connect.
+        """
+        if self.local_ip is None:
+            self.local_ip = await self.find_local_ip()
+        if self.conn is not None:
+            await self.conn.close()
+        self.dead = False
+        self.session = None
+        self.conn = connection.ClientConnection(ip, self.port, self.recv_size)
+        await self.conn.open()
+        self.conn.write(credentials.encode())
+        return await self.conn.read_raw()
+
+    def read_server_key(self, message):
+        """
+        ChatClient.read_server_key(message)
+        Reads the server's public key out of its handshake reply,
+            "[modulus]\\n[exponent]", plus "\\nsession" if the server
+            can do session frames.
+        Raises an exception if the reply isn't a key (login denied).
+        """
+        lines = message.decode().split("\n")
+        self.server_key = rsa.PublicKey(int(lines[0]), int(lines[1]))
+        if encryption.SESSION_FLAG in lines[2:]:
+            self.session = encryption.Session()
+        else:
+            self.session = None
+
+    async def main_loop(self):
+        """
+        ChatClient.main_loop() -> bool
+        Finishes the handshake and starts listening to the chatroom.
+        Frames are handled by handle_frame from then on.
+        """
+        welcome = f"{self.username} is in at {str(datetime.now())[:-6]}"
+        if self.session is not None:
+            # Our session key is the acknowledgement.
+            # The welcome message has to wait until the key is in use.
+            self.conn.write(
+                self.session.offer(self.server_key) + framing.DELIMITER)
+        else:
+            # Send a welcome message! Straight out, it's part of the handshake.
+            self.conn.write(self.encrypt(welcome))
+        # Get all info.
+        try:
+            info = self.decrypt(await self.conn.read_frame()).split("\n")
+        except ConnectionError as e:
+            self.connection_lost(e)
+            return False
+        self.data["money"] = int(info[0])
+        self.data["cookies"] = int(info[1])
+        self.prev_hash = info[2]
+        self.hash_zeros = int(info[3])
+        self.conn.write(b" ")
+        if self.session is not None:
+            self.conn.write(self.encrypt(welcome))
+
+        # Mine away!
+        if self.mine:
+            _thread.start_new(Mining.mine, (self,))
+
+        # Frames that came in with the info are handled first.
+        self.conn.start(self.handle_frame, self.connection_lost)
+        return True
+
+    def handle_frame(self, message):
+        """
+        ChatClient.handle_frame(message)
+        Handles one frame from the server.
+        Called by the connection's reader task, on the event loop.
+        """
+        if self.dead or len(message) < self.header_length() + 1:
+            return
+
+        # Decryption try/catch.
+        message = self.decrypt(message)
+        if type(message) != str:
+            return
+
+        # Yoy! Message processing.
+        for line in message.split("\n"):
+            record = messages.parse(line)
+            for handler in self.handlers.get(record.kind, ()):
+                handler(record)
+            if self.dead:
+                # Kicked, most likely. Nothing after that counts.
+                break
+
+    def register(self, kind, handler):
+        """
+        ChatClient.register(kind, handler)
+        Calls handler(record) for every messages.Message of that kind,
+            after the ones already registered. For plugins: new commands
+            need messages.register_command too.
+        """
+        self.handlers.setdefault(kind, []).append(handler)
+
+    def on_chat(self, record):
+        """
+        ChatClient.on_chat(record)
+        Chat and whispers just get shown.
+        """
+        if record.username == "Server" and record.text.startswith(
+                "Your password has been successfully changed."):
+            if self.new_password is not None and self.last_login is not None:
+                # So reconnecting uses the new one.
+                ip, username, _ = self.last_login
+                self.last_login = (ip, username, self.new_password)
+            self.new_password = None
+            self.emit("password_changed")
+        if self.message_store is not None:
+            self.message_store.add(
+                self.chat_of(record), record.username, record.kind, record.text)
+        self.emit("message", record)
+
+    def chat_of(self, record):
+        """
+        ChatClient.chat_of(record) -> str
+        Which chat a message belongs in: whoever a whisper is with, or
+            the Lobby.
+        """
+        if record.kind != messages.WHISPER or record.username == "Server":
+            return "Lobby"
+        if record.target is not None and record.username == self.username:
+            return record.target
+        return record.username
+
+    def on_error(self, record):
+        """
+        ChatClient.on_error(record)
+        "Server> /e ..." gets shown; "/e delacc ..." and
+            "/e changepass ..." go to whoever asked.
+        """
+        if record.username:
+            self.emit("message", record)
+        elif record.target == "delacc":
+            self.emit("delacc_error", record.text)
+        elif record.target == "changepass":
+            self.emit("changepass_error", record.text)
+
+    def on_kicked(self, record):
+        """
+        ChatClient.on_kicked(record)
+        """
+        self.emit("kicked", record.line)
+        self.close()
+
+    def on_balance(self, record):
+        """
+        ChatClient.on_balance(record)
+        Add or subtract money.
+        (Changing this won't do anything; balances are stored on the server.)
+        """
+        self.data["money"] += int(record.args[0])
+        self.save_data()
+        self.emit("balance", int(record.args[0]))
+        # Our own row on the leaderboard doesn't need to wait for the server.
+        if self.leaderboard.rank(self.username) is not None:
+            changed = self.leaderboard.set(self.username, self.data["money"])
+            if changed is not None:
+                self.emit("leaderboard", changed)
+
+    def on_cookies(self, record):
+        """
+        ChatClient.on_cookies(record)
+        """
+        self.data["cookies"] += int(record.args[0])
+        self.save_data()
+        self.emit("cookies", int(record.args[0]))
+
+    def on_new_hash(self, record):
+        """
+        ChatClient.on_new_hash(record)
+        New hash for the blockchain!
+        """
+        self.prev_hash = record.args[0]
+        if self.miner is not None:
+            self.miner.new_hash(self.prev_hash)
+        self.emit("new_hash", self.prev_hash)
+
+    def on_leaderboard(self, record):
+        """
+        ChatClient.on_leaderboard(record)
+        Only tells anybody if something actually changed.
+        """
+        changed = self.leaderboard.update(record.args)
+        self.leaderboard_cache.updated()
+        if changed is not None:
+            self.emit("leaderboard", changed)
+
+    def on_ping(self, record):
+        """
+        ChatClient.on_ping(record)
+        Answers to latency.LatencyMonitor probes are left to it.
+        """
+        if record.args and record.args[0].startswith(latency.PROBE_TAG):
+            return
+        self.delay = time.time() - self.pingTime
+        self.pingTime = time.time()
+        self.emit("ping", self.delay)
+
+    def connection_lost(self, error):
+        """
+        ChatClient.connection_lost(error)
+        The reader task calls this when the server goes away.
+        """
+        self.close(error)
+
+    def close(self, error=None):
+        """
+        ChatClient.close(error=None)
+        Stops mining and closes the connection, then sends the
+            "disconnected" event. Safe from any thread; doesn't wait for
+            the connection to finish closing.
+        If error isn't None and we have a reconnector, it takes over
+            instead, and "disconnected" only comes if it gives up.
+        """
+        loop = connection.get_loop()
+        resuming = self.reconnector is not None and self.reconnector.resuming
+        if self.dead:
+            if error is None and resuming:
+                # Hung up on while waiting to reconnect.
+                self.reconnector.stop()
+                self.stop_jobs()
+                self.wrap_up(True)
+                loop.call_soon_threadsafe(self.emit, "disconnected", None)
+            return
+        retrying = (
+            error is not None and self.reconnector is not None
+            and self.reconnector.enabled and bool(self.last_login))
+        # Whatever is still waiting to be sent (or saved) goes first.
+        #     Unless we're about to reconnect: then it waits for that,
+        #     rather than going to a connection that's already gone.
+        if not retrying:
+            self.flush()
+            self.stop_jobs()
+        self.wrap_up(not retrying)
+        self.dead = True
+        if self.miner is not None:
+            self.miner.stop()
+            self.miner = None
+        if self.conn is not None:
+            connection.submit(self.conn.close())
+
+        if self.reconnector is not None:
+            if retrying:
+                loop.call_soon_threadsafe(self.reconnector.start, error)
+                return
+            self.reconnector.stop()
+        loop.call_soon_threadsafe(self.emit, "disconnected", error)
+
+    def wrap_up(self, final):
+        """
+        ChatClient.wrap_up(final)
+        flush_data(), and if we're not coming back (final), closes the
+            message store too.
+        That's disk work, so on the event loop it goes to a worker thread
+            instead of holding up every other connection.
+        """
+        def work():
+            self.flush_data()
+            if final and self.message_store is not None:
+                self.message_store.close()
+
+        loop = connection.get_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.run_in_executor(None, work)
+        else:
+            work()
+
+    def send(self, message):
+        """
+        ChatClient.send(message)
+        Send a message to the server.
+        Safe to call from any thread. A message on its own goes out right
+            away (so do pings, always); ones that come within sendWindowMs
+            of the last send are held for that long and joined with "\n"
+            into one frame (the server splits them up again, see api.md),
+            so bursts cost one encryption and one write instead of one each.
+        """
+        if isinstance(message, bytes):
+            message = message.decode()
+        if message.startswith(("/changepass ", "/newpass ")):
+            self.new_password = message.split()[-1]
+        urgent = message.startswith("/ping")
+        with self.outgoing_lock:
+            self.outgoing.append(message)
+            if self.flush_pending and not urgent:
+                return
+            self.flush_pending = True
+            burst = time.monotonic() - self.last_flush < self.send_window
+        loop = connection.get_loop()
+        if burst and not urgent:
+            loop.call_soon_threadsafe(loop.call_later, self.send_window, self.flush)
+        else:
+            loop.call_soon_threadsafe(self.flush)
+
+    def flush(self):
+        """
+        ChatClient.flush()
+        Encrypts everything send() has queued, as few frames as possible,
+            and hands them to the connection in one go.
+        While we're reconnecting (or about to), it all stays queued (the
+            newest backlog messages, anyway) for when we're back.
+        """
+        with self.outgoing_lock:
+            self.flush_pending = False
+            if self.outgoing:
+                self.last_flush = time.monotonic()
+            if self.dead or (self.reconnector is not None and self.reconnector.resuming):
+                while len(self.outgoing) > self.backlog:
+                    self.outgoing.popleft()
+                return
+            pending = list(self.outgoing)
+            self.outgoing.clear()
+        if not pending or self.conn is None:
+            return
+
+        # Timing starts when it actually goes out.
+        if any(
+            message.startswith("/ping") and not message.startswith(
+                f"/ping {latency.PROBE_TAG}") for message in pending):
+            self.pingTime = time.time()
+
+        frames = []
+        batch = []
+        size = 0
+        for message in pending:
+            if batch and size + len(message) > self.max_frame:
+                frames.append(self.encrypt("\n".join(batch)))
+                batch = []
+                size = 0
+            batch.append(message)
+            size += len(message) + 1
+        frames.append(self.encrypt("\n".join(batch)))
+        self.conn.write(b"".join(frames))
+
+    def encrypt(self, message):
+        """
+        ChatClient.encrypt(message) -> bytes
+        One frame for the server, delimiter included.
+        """
+        if self.session is not None:
+            frame = self.session.encrypt(message)
+        else:
+            frame = encryption.encrypt(
+                message, self.server_key, self.key_length)
+        return frame + framing.DELIMITER
+
+    def header_length(self):
+        """
+        ChatClient.header_length() -> int
+        How many bytes come before the ciphertext in a frame from the server.
+        """
+        if self.session is not None:
+            return self.session.header_length
+        return self.rsa_key_length
+
+    def decrypt(self, message):
+        """
+        ChatClient.decrypt(message) -> str
+        Decrypts a message given in bytes to return a string.
+        We use standard a symmetric CTR AES cipher with the key encrypted using RSA,
+            or the session key if the server agreed to one.
+        """
+        try:
+            if self.session is not None:
+                return self.session.decrypt(message)
+            return encryption.decrypt(
+                message, self.private_key, self.rsa_key_length)
+
+        except:
+            self.decrypt_failures.inc()
+            print(f"Could not decrypt: {message}")
+            return 0
+
+    def save_data(self):
+        """
+        ChatClient.save_data()
+        Saves self.data into data.json soon, if we have one.
+        Lots of calls in a row only write once (see datastore.py).
+        """
+        if self.store is not None:
+            self.store.mark_dirty()
+
+    def flush_data(self):
+        """
+        ChatClient.flush_data()
+        Saves self.data right now, if anything's changed, and any chat
+            messages waiting to be saved.
+        """
+        if self.store is not None:
+            self.store.flush()
+        if self.message_store is not None:
+            self.message_store.flush()
@@ -0,0 +1,385 @@
+"""
+chat_view.py
+Python Chatroom
+
+A chat tab used to be three Listboxes (names, messages, times) that
+    kept every message forever and had to be scrolled together.
+Now each tab is one canvas that only draws the rows you can actually
+    see, reading them out of a ring of message records. Scrolling is
+    just changing which records get drawn.
+"""
+
+import datetime
+import tkinter as tk
+import tkinter.font as tkfont
+
+
+class MessageRing:
+    """
+    Keeps the newest size records. Older ones fall off the end.
+    Records are numbered from 0 forever, so a number always means the
+        same record for as long as it's still here.
+    """
+
+    def __init__(self, size=10000):
+        """
+        MessageRing.__init__(size=10000) -> MessageRing
+        Makes an empty ring that holds up to size records.
+        """
+        self.size = size
+        self.slots = [None] * size
+        # Number of the next record to be added.
+        self.end = 0
+
+    @property
+    def first(self):
+        """
+        MessageRing.first -> int
+        Number of the oldest record still kept.
+        """
+        return max(self.end - self.size, 0)
+
+    def append(self, record):
+        """
+        MessageRing.append(record)
+        Adds a record, pushing out the oldest if we're full.
+        """
+        self.slots[self.end % self.size] = record
+        self.end += 1
+
+    def get(self, index):
+        """
+        MessageRing.get(index) -> record
+        The record with that number, or None if it's gone (or not here yet).
+        """
+        if self.first <= index < self.end:
+            return self.slots[index % self.size]
+        return None
+
+
+class VirtualList(tk.Frame):
+    """
+    A scrollable list of rows with columns, drawn on a canvas.
+    Only visible rows have canvas items, and those get reused, so it
+        doesn't matter how many records the store has.
+    The store needs first, end and get(index), like MessageRing.
+    (Or history.ChatHistory, which goes to disk for old records.)
+    """
+
+    def __init__(self, master, store, columns, font, fg="#000000", bg="#FFFFFF", height=20):
+        """
+        VirtualList.__init__(master, store, columns, font, fg="#000000", bg="#FFFFFF", height=20) -> VirtualList
+        columns is a list of (width, anchor) pairs, one per column. width is
+            in characters; a width of 0 means "whatever space is left".
+            anchor is "w" or "e".
+        height is the number of rows shown before any resizing.
+        """
+        tk.Frame.__init__(self, master, bg=bg)
+        self.store = store
+        self.columns = columns
+        self.fg = fg
+        self.bg = bg
+        self.font = tkfont.Font(font=font)
+        self.line = self.font.metrics("linespace")
+        self.char = self.font.measure("0")
+        self.top = 0
+        # True while we're stuck to the newest row.
+        self.follow = True
+        self.items = []
+        # What each item was last drawn with, so unchanged ones are left alone.
+        self.drawn = []
+        # Record number to highlight (see mark), and the box behind it.
+        self.marked = None
+        self.marker = None
+        self.pending = False
+
+        self.canvas = tk.Canvas(
+            self, bg=bg, bd=0, highlightthickness=0,
+            width=sum(w or 60 for w, _ in columns) * self.char,
+            height=height * self.line
+        )
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind("<MouseWheel>", self.mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll(3))
+
+    def rows(self):
+        """
+        VirtualList.rows() -> int
+        How many rows fit in the canvas right now.
+        """
+        return max(self.canvas.winfo_height() // self.line, 1)
+
+    def refresh(self):
+        """
+        VirtualList.refresh()
+        Redraws when Tk is next idle. Calling this lots of times in a row
+            still only redraws once.
+        """
+        if not self.pending:
+            self.pending = True
+            self.after_idle(self.redraw)
+
+    def row(self, record):
+        """
+        VirtualList.row(record) -> (texts, colors)
+        Turns a record into one string and one color (or None) per column.
+        Subclasses say how.
+        """
+        return record, [None] * len(self.columns)
+
+    def layout(self):
+        """
+        VirtualList.layout() -> list
+        The (x, anchor, width) of every column in pixels, for the current width.
+        """
+        pad = 5
+        fixed = sum(w for w, _ in self.columns) * self.char
+        spare = max(
+            self.canvas.winfo_width() - fixed - pad * 2 * len(self.columns),
+            self.char
+        )
+        x = 0
+        positions = []
+        for width, anchor in self.columns:
+            width = width * self.char if width else spare
+            x += pad
+            positions.append((x + width if anchor == "e" else x, anchor, width))
+            x += width + pad
+        return positions
+
+    def redraw(self):
+        """
+        VirtualList.redraw()
+        Draws whatever rows are in view.
+        """
+        self.pending = False
+        rows = self.rows()
+        first, end = self.store.first, self.store.end
+        bottom = max(end - rows, first)
+        if self.follow:
+            self.top = bottom
+        self.top = min(max(self.top, first), bottom)
+
+        layout = self.layout()
+        if len(self.items) != rows:
+            self.canvas.delete("all")
+            self.items = [
+                [
+                    self.canvas.create_text(
+                        0, r * self.line, font=self.font, text="")
+                    for _ in self.columns
+                ]
+                for r in range(rows)
+            ]
+            self.drawn = [[None] * len(self.columns) for _ in range(rows)]
+            self.marker = self.canvas.create_rectangle(
+                0, 0, 0, 0, fill="#FFF2A8", outline="", state="hidden")
+            self.canvas.tag_lower(self.marker)
+
+        for r in range(rows):
+            record = self.store.get(self.top + r)
+            if record is None:
+                texts, colors = [""] * len(self.columns), [None] * len(self.columns)
+            else:
+                texts, colors = self.row(record)
+            for c, (item, text, color, (x, anchor, width)) in enumerate(zip(
+                self.items[r], texts, colors, layout
+            )):
+                # Chop off what won't fit, like a Listbox would.
+                text = str(text)[:max(width // self.char, 1)]
+                look = (text, color, x, anchor)
+                if self.drawn[r][c] == look:
+                    continue
+                self.drawn[r][c] = look
+                self.canvas.coords(item, x, r * self.line)
+                self.canvas.itemconfig(
+                    item, text=text, fill=color or self.fg,
+                    anchor="n" + anchor, font=self.font
+                )
+
+        if self.marked is not None and self.top <= self.marked < self.top + rows:
+            y = (self.marked - self.top) * self.line
+            self.canvas.coords(
+                self.marker, 0, y, self.canvas.winfo_width(), y + self.line)
+            self.canvas.itemconfig(self.marker, state="normal")
+        else:
+            self.canvas.itemconfig(self.marker, state="hidden")
+
+        total = end - first
+        if total <= rows:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(
+                (self.top - first) / total, (self.top - first + rows) / total)
+
+    def yview(self, *args):
+        """
+        VirtualList.yview(*args)
+        Handle for the scrollbar: ("moveto", fraction) or
+            ("scroll", number, "units" or "pages").
+        """
+        first, end = self.store.first, self.store.end
+        if args[0] == "moveto":
+            self.top = first + int(float(args[1]) * (end - first))
+            self.follow = self.top >= end - self.rows()
+            self.refresh()
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.rows()
+            self.scroll(amount)
+
+    def scroll(self, amount):
+        """
+        VirtualList.scroll(amount)
+        Moves the view by that many rows. Negative is up.
+        """
+        self.top += amount
+        self.follow = self.top >= self.store.end - self.rows()
+        self.refresh()
+        return "break"
+
+    def mouse_wheel(self, event):
+        """
+        VirtualList.mouse_wheel(event)
+        Scrolls with the wheel (on Windows and Mac; X11 uses buttons 4 and 5).
+        """
+        return self.scroll(-event.delta // 20)
+
+    def at_bottom(self):
+        """
+        VirtualList.at_bottom() -> bool
+        Whether the newest row is in view.
+        """
+        return self.follow or self.top >= self.store.end - self.rows()
+
+    def see(self, index):
+        """
+        VirtualList.see(index)
+        Scrolls so that record number index is in view.
+        "end" means the newest one, and sticks there.
+        """
+        if index == "end":
+            self.follow = True
+        else:
+            rows = self.rows()
+            if not self.top <= index < self.top + rows:
+                self.top = index - rows // 2
+            self.follow = self.top >= self.store.end - rows
+        self.refresh()
+
+    def mark(self, index):
+        """
+        VirtualList.mark(index)
+        Highlights record number index and scrolls to it.
+        None takes the highlight away.
+        """
+        self.marked = index
+        if index is None:
+            self.refresh()
+        else:
+            self.see(index)
+
+    def set_font(self, font):
+        """
+        VirtualList.set_font(font)
+        Changes the font and redraws.
+        """
+        rows = self.rows()
+        self.font = tkfont.Font(font=font)
+        self.line = self.font.metrics("linespace")
+        self.char = self.font.measure("0")
+        # Every item needs the new font.
+        self.items = []
+        self.canvas.config(height=rows * self.line)
+        self.refresh()
+
+
+class ChatView(VirtualList):
+    """
+    One chat tab: username, message and time columns.
+    Records are messages.ChatRecords. Their kind picks the color, from
+        colors, so changing a color there changes it for every message.
+    """
+
+    def __init__(self, master, font, fg="#000000", bg="#FFFFFF", store=None, colors=None):
+        """
+        ChatView.__init__(master, font, fg="#000000", bg="#FFFFFF", store=None, colors=None) -> ChatView
+        store is where the messages go, like a MessageRing or a
+            history.ChatHistory. The default keeps the newest 10000.
+        colors is {messages.Kind: color}; kinds that aren't in it get fg.
+            Views can share one dict.
+        """
+        if store is None:
+            store = MessageRing()
+        VirtualList.__init__(
+            self, master, store, [(20, "w"), (0, "w"), (20, "e")],
+            font, fg, bg
+        )
+        self.colors = colors if colors is not None else {}
+
+    def add(self, record):
+        """
+        ChatView.add(record) -> int
+        Adds a messages.ChatRecord at the bottom.
+        Redrawing waits until Tk is idle, so adding lots at once is cheap.
+        Returns the message's number, for see() and mark().
+        """
+        self.store.append(record)
+        self.refresh()
+        return self.store.end - 1
+
+    def row(self, record):
+        """
+        ChatView.row(record) -> (texts, colors)
+        The time only becomes text here. It isn't colored.
+        """
+        color = self.colors.get(record.kind)
+        return (
+            (record.username, record.text, str(datetime.datetime.fromtimestamp(record.ts))),
+            (color, color, None)
+        )
+
+
+class LeaderboardView(VirtualList):
+    """
+    The leaderboard window's list: rank, username and coins.
+    The store is a leaderboard.Leaderboard. It starts at the top rather
+        than sticking to the bottom like a chat.
+    """
+
+    def __init__(self, master, board, font, fg="#000000", bg="#FFFFFF"):
+        """
+        LeaderboardView.__init__(master, board, font, fg="#000000", bg="#FFFFFF") -> LeaderboardView
+        """
+        VirtualList.__init__(
+            self, master, board, [(8, "e"), (0, "w"), (12, "e")], font, fg, bg)
+        self.follow = False
+        # username -> color, for us and for search results.
+        self.colors = {}
+
+    def row(self, record):
+        """
+        LeaderboardView.row(record) -> (texts, colors)
+        """
+        color = self.colors.get(record[1])
+        return record, (color, color, color)
+
+    def changed(self, low, high):
+        """
+        LeaderboardView.changed(low, high)
+        Positions low to high (not included) are different now. Only
+            redraws if some of them are on screen, or the length changed.
+        """
+        if low < self.top + self.rows() and high > self.top:
+            self.refresh()
+        elif high >= self.store.end:
+            # Off screen, but the scrollbar needs to know.
+            self.refresh()
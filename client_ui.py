@@ -5,15 +5,24 @@ v5.0.4, November 2019
 """
 
 # Agh, imports.
+import collections
 import ctypes
-import datetime
 import hashlib
+import os
 import sys
+import tempfile
+import time
 import tkinter as tk
 import tkinter.ttk as ttk
 
 import _thread
 
+import chat_view
+import history
+import messages
+import metrics
+import search
+
 
 class ClientUI():
     """
@@ -38,6 +47,9 @@ class ClientUI():
         self.whisper_color = "#0051FF"
         self.error_color = "#FF0000"
         self.personal_color = "#33A314"
+        # messages.Kind -> color, shared by every chat view.
+        self.kind_colors = {}
+        self.update_kind_colors()
         self.bg = "#FFFFFF"
         self.fg = "#000000"
         self.save_pass = tk.IntVar()
@@ -46,6 +58,14 @@ class ClientUI():
         self.notifications.set(int(self.master.data["notifications"]))
         self.notified = False
         self.top_levels = set()
+        self.histories = {}
+        # Every message shown, for the search window.
+        self.search_index = search.SearchIndex()
+        # Old chat messages go here once there are too many to keep in memory.
+        # Every client gets its own, so two open at once don't write over
+        #     each other's files.
+        self.history_tmp = tempfile.TemporaryDirectory(prefix="chatroom-history-")
+        self.history_dir = self.history_tmp.name
 
         # Set up widget attributes.
         self.da_title = None
@@ -56,6 +76,10 @@ class ClientUI():
         self.options_menu = None
         self.acc_menu = None
 
+        # Everything the network side wants done goes through here.
+        self.dispatch = DispatchQueue(self)
+        self.dispatch.start()
+
         self.style = ttk.Style()
         # self.style.theme_use("vista")
         self.configure_style()
@@ -73,8 +97,7 @@ class ClientUI():
         self.master["bg"] = "white"
         self.master.protocol(
             "WM_DELETE_WINDOW", lambda event=None: _thread.start_new(self.on_closing, ()))
-        self.master.bind(
-            "<Return>", lambda event=None: _thread.start_new(self.master.login, ()))
+        self.master.bind("<Return>", self.master.login)
         self.master.bind(
             "<Escape>", lambda event=None: _thread.start_new(self.on_closing, ()))
         for widget in self.master.winfo_children():
@@ -101,8 +124,7 @@ class ClientUI():
             if not type(widget) == tk.Toplevel:
                 widget.grid_forget()
             del widget
-        self.master.bind(
-            "<Return>", lambda event=None: _thread.start_new(self.master.login, ()))
+        self.master.bind("<Return>", self.master.login)
         self.menubar = tk.Menu(self.master, relief="sunken")
         self.master.config(menu=self.menubar)
 
@@ -120,7 +142,7 @@ class ClientUI():
         )
         self.button = ttk.Button(
             self.master, text="Log In",
-            command=lambda event=None: _thread.start_new(self.master.login, ())
+            command=self.master.login
         )
         self.r_button = ttk.Button(
             self.master, width=20, text="Register New Account", command=self.register
@@ -163,25 +185,92 @@ class ClientUI():
         """
         ClientUI.insert(message, title = None)
         Inserts a new message in the given tab.
+        message is a line or a messages.Message.
         If title is not None, we don't get to choose.
         """
-        if ">" in message:
-            index = message.index(">")
-            username = message[:index]
-        else:
-            index = -2
-            username = ""
-        substance = message[index + 2:]
+        self.insert_many((message,), title)
+
+    def insert_many(self, records, title=None):
+        """
+        ClientUI.insert_many(records, title = None)
+        Inserts a bunch of messages (lines or messages.Message), in order.
+        Scrolling and notifications happen once for the whole batch
+            instead of once per message.
+        """
+        start = time.perf_counter()
+        at_bottom = {
+            tab: view.at_bottom() for tab, view in self.chat_boxes.items()
+        }
+        last = None
+        for record in records:
+            # One bad message only loses itself, not the rest of the batch.
+            try:
+                if isinstance(record, str):
+                    record = messages.parse(record)
+                last = self.add_message(record, title)
+            except Exception as e:
+                print(f"Could not show a message: {e}")
+        metrics.timer("ui_insert_seconds").record(time.perf_counter() - start)
+        metrics.counter("ui_messages_inserted").inc(len(records))
+        if last is None:
+            return
+        username, text, whisper, error = last
+
+        # Based on settings, see the end.
+        current = self.chats.tab(self.chats.select(), "text")
+        if at_bottom.get(current, True):
+            self.chat_boxes[current].see("end")
+
+        # After that, raise notifications if necessary.
+        if self.master.focus_get() is None and self.notifications.get() == 1 and not self.notified:
+            self.notified = True
+            nf_win = tk.Toplevel(self.master)
+            self.top_levels.add(nf_win)
+            nf_win.attributes("-topmost", True)
+            nf_win.resizable(False, False)
+            nf_win.title(f"{self.master.title()} Notification")
+            nf_win.protocol(
+                "WM_DELETE_WINDOW",
+                lambda: self.close_notification(nf_win)
+            )
+            # nf_win.iconbitmap(self.icon_dir)
+            nf_win.config(bg=self.bg)
+            description = ttk.Label(nf_win, text="You have a new message: ")
+            label = tk.Label(
+                nf_win, bg=self.bg, text=f"{username}> {text}", font=self.font)
+            if whisper or error:
+                label.config(
+                    fg=self.whisper_color if whisper else self.error_color)
+
+            description.grid(row=0, column=0, padx=20, pady=(20, 0), sticky="w")
+            label.grid(row=1, column=0, padx=20, sticky="w")
+
+            close_button = ttk.Button(
+                nf_win, text="Dismiss",
+                command=lambda: self.close_notification(nf_win)
+            )
+            close_button.grid(row=2, column=0, pady=5)
+
+    def add_message(self, record, title=None):
+        """
+        ClientUI.add_message(record, title = None) -> tuple
+        Puts one messages.Message into the right tab, without scrolling or
+            notifying. The parsing was already done by messages.parse.
+        Returns (username, text, whisper, error) for the notification.
+        """
+        username = record.username
+        text = record.substance
 
         # Check for whispers and errors, and format appropriately.
         whisper = False
         error = False
-        if substance.startswith("/w ") and title is None:
+        if record.kind == messages.WHISPER and title is None:
             whisper = True
+            text = record.substance[3:]
             # If we whisper to somebody else, have it be in the same chat.
-            if substance.startswith("/w To:") and username == self.master.username:
-                title = substance.split(" ")[1][3:]
-                substance = " ".join(substance.split(" ")[2:])
+            if record.target is not None and username == self.master.username:
+                title = record.target
+                text = record.text
                 whisper = False
 
             else:
@@ -200,78 +289,29 @@ class ClientUI():
         if title is None:
             title = self.chats.tab(self.chats.select(), "text")
 
-        if substance.startswith("/e ") and username == "Server":
+        if record.kind == messages.ERROR and username == "Server":
             error = True
+            text = record.text
             title = self.chats.tab(self.chat_frames[title], "text")
             self.chats.select(self.chat_frames["Lobby"])
 
-        autoscroll = self.scrollbars[self.chats.tab(
-            self.chats.select(), "text")].get()[1] == 1
-
-        # Insert text into the listboxes.
-        if whisper or error:
-            self.chat_boxes[title][1].insert("end", substance[3:])
-        else:
-            self.chat_boxes[title][1].insert("end", substance)
-
-        self.chat_boxes[title][0].insert("end", username)
-        self.chat_boxes[title][2].insert("end", str(datetime.datetime.now()))
-
-        # Based on settings, see the end.
-        if autoscroll:
-            for i in range(3):
-                self.chat_boxes[self.chats.tab(
-                    self.chats.select(), "text")][i].see("end")
-
-        # coloring!
+        # coloring! (The views pick the color from the kind.)
+        kind = messages.Kind.CHAT
         if whisper and username != self.master.username:
-            for i in (0, 1):
-                self.chat_boxes[title][i].itemconfig(
-                    "end", {"fg": self.whisper_color})
+            kind = messages.Kind.WHISPER
 
         elif error:
-            for i in (0, 1):
-                self.chat_boxes[title][i].itemconfig(
-                    "end", {"fg": self.error_color})
+            kind = messages.Kind.ERROR
 
         if username == self.master.username:
-            for i in (0, 1):
-                self.chat_boxes[title][i].itemconfig(
-                    "end", {"fg": self.personal_color})
+            kind = messages.Kind.OWN
 
-        # After that, raise notifications if necessary.
-        if self.master.focus_get() is None and self.notifications.get() == 1 and not self.notified:
-            self.notified = True
-            nf_win = tk.Toplevel(self.master)
-            self.top_levels.add(nf_win)
-            nf_win.attributes("-topmost", True)
-            nf_win.resizable(False, False)
-            nf_win.title(f"{self.master.title()} Notification")
-            nf_win.protocol(
-                "WM_DELETE_WINDOW",
-                lambda: self.close_notification(nf_win)
-            )
-            # nf_win.iconbitmap(self.icon_dir)
-            nf_win.config(bg=self.bg)
-            description = ttk.Label(nf_win, text="You have a new message: ")
-            if whisper or error:
-                label = tk.Label(
-                    nf_win, bg=self.bg, text=f"{username}> {substance[3:]}", font=self.font
-                )
-                label.config(
-                    fg=self.whisper_color if whisper else self.error_color)
-            else:
-                label = tk.Label(
-                    nf_win, bg=self.bg, text=f"{username}> {substance}", font=self.font)
-
-            description.grid(row=0, column=0, padx=20, pady=(20, 0), sticky="w")
-            label.grid(row=1, column=0, padx=20, sticky="w")
+        # Into the chat view it goes, and the same record into the search index.
+        chat_record = messages.ChatRecord(username, text, kind)
+        position = self.chat_boxes[title].add(chat_record)
+        self.search_index.add(title, position, chat_record)
 
-            close_button = ttk.Button(
-                nf_win, text="Dismiss",
-                command=lambda: self.close_notification(nf_win)
-            )
-            close_button.grid(row=2, column=0, pady=5)
+        return username, text, whisper, error
 
     def register(self, event=None):
         """
@@ -288,7 +328,7 @@ class ClientUI():
         self.button.grid(row=5, column=2)
         self.master.bind(
             "<Return>",
-            lambda event=None: _thread.start_new(self.master.make_account, ())
+            self.master.make_account
         )
 
         self.entries[0].focus_set()
@@ -303,8 +343,7 @@ class ClientUI():
 
         # Now make the proper stuff.
         self.r_button["text"] = "Create New Account"
-        self.r_button.configure(command=lambda event=None: _thread.start_new(
-            self.master.make_account, ()))
+        self.r_button.configure(command=self.master.make_account)
         self.r_button.grid(
             row=5, column=2, padx=5, pady=5, columnspan=2, sticky="e"
         )
@@ -317,28 +356,19 @@ class ClientUI():
         """
         self.chat_frames[title] = tk.Frame(
             self.chats, bg=self.bg, width=100, height=60)
-        self.chat_frames[title].columnconfigure(0, weight=0)
-        self.chat_frames[title].columnconfigure(1, weight=1)
-        self.chat_frames[title].columnconfigure(2, weight=0)
-        self.scrollbars[title] = tk.Scrollbar(
-            self.chat_frames[title], command=lambda *args: self.onvsb(*args, title=title))
-
-        self.chat_boxes[title] = []
-        widths = [20, 60, 30]
-        for i in range(3):
-            self.chat_boxes[title].append(tk.Listbox(
-                self.chat_frames[title], width=widths[i], height=20, font=self.font, relief="flat"))
-            self.chat_boxes[title][i].configure(
-                bd=0, fg=self.fg, highlightthickness=0, selectmode="browse")
-            self.chat_boxes[title][i].configure(
-                yscrollcommand=self.scrollbars[title].set)
-            self.chat_boxes[title][i].bind(
-                "<MouseWheel>", lambda event: self.mouse_wheel(event, title))
-            self.chat_boxes[title][i].grid(
-                row=0, column=i, padx=5, sticky="we")
-        self.chat_boxes[title][2].configure(justify="right")
-
-        self.scrollbars[title].grid(row=0, column=3, sticky="ns")
+        self.chat_frames[title].columnconfigure(0, weight=1)
+        self.chat_frames[title].rowconfigure(0, weight=1)
+
+        self.histories[title] = history.ChatHistory(
+            os.path.join(self.history_dir, f"{safe_name(title)}.jsonl"),
+            self.master.data.get("historyCap", 2000)
+        )
+        self.chat_boxes[title] = chat_view.ChatView(
+            self.chat_frames[title], self.font, self.fg, self.bg,
+            self.histories[title], self.kind_colors
+        )
+        self.chat_boxes[title].grid(row=0, column=0, padx=5, sticky="nsew")
+
         self.chat_frames[title].grid()
         self.chats.add(self.chat_frames[title], text=title)
 
@@ -384,6 +414,8 @@ class ClientUI():
         self.stats_menu.add_command(
             label="Leaderboard", command=self.create_leaderboard)
         self.menubar.add_cascade(label="Statistics", menu=self.stats_menu)
+        self.menubar.add_command(label="Search", command=self.create_search)
+        self.master.bind("<Control-f>", lambda event=None: self.create_search())
 
         for color_name in ("whisper", "error", "personal"):
             self.options_menu.add_command(
@@ -408,7 +440,9 @@ class ClientUI():
         self.chats = ttk.Notebook(self.master)
         self.chat_frames = {}
         self.chat_boxes = {}
-        self.scrollbars = {}
+        self.close_histories()
+        self.histories = {}
+        self.search_index = search.SearchIndex()
         self.entry = ttk.Entry(self.master, width=103, font=self.font)
         self.entry.focus_set()
 
@@ -421,6 +455,8 @@ class ClientUI():
             self.master.username
         )
 
+        self.reload_messages()
+
         self.chats.grid(
             row=2, column=0, padx=5, pady=5, columnspan=2, sticky="new"
         )
@@ -430,10 +466,76 @@ class ClientUI():
         ttk.Label(
             self.master, text=f"{self.master.username}>"
         ).grid(row=3, column=0, padx=(5, 0), pady=5)
+        self.show_latency()
 
         self.master.grid_rowconfigure(0, weight=1)
         self.master.grid_columnconfigure(1, weight=1)
 
+    def reload_messages(self):
+        """
+        ClientUI.reload_messages()
+        Puts the newest messages of every chat back, from last time, if
+            the client keeps them (see message_store.py).
+        """
+        # A master without a ChatClient (like bench_e2e's) has nothing to reload.
+        core = getattr(self.master, "core", None)
+        store = getattr(core, "message_store", None)
+        if store is None:
+            return
+        count = self.master.data.get("reloadMessages", 100)
+        rows = []
+        for chat in store.chats():
+            rows.extend(store.recent(chat, count))
+        # Oldest first, so the search index gets them in order.
+        rows.sort(key=lambda row: row[1])
+
+        for chat, when, username, kind, text in rows:
+            if chat not in self.chat_boxes:
+                self.new_chat(chat)
+            shown = messages.Kind.CHAT
+            if username == self.master.username:
+                shown = messages.Kind.OWN
+            elif kind == messages.WHISPER:
+                shown = messages.Kind.WHISPER
+            chat_record = messages.ChatRecord(username, text, shown, when)
+            position = self.chat_boxes[chat].add(chat_record)
+            self.search_index.add(chat, position, chat_record)
+
+    def show_latency(self):
+        """
+        ClientUI.show_latency()
+        Puts a status bar with ping times at the bottom, if the client has
+            a latency monitor (see latency.py).
+        """
+        if getattr(self.master, "latency", None) is None:
+            return
+        if getattr(self, "status", None) is not None:
+            self.status.destroy()
+        self.status = ttk.Label(
+            self.master, text="Latency: waiting for the first ping...",
+            font=self.s_font
+        )
+        self.status.grid(row=4, column=0, columnspan=3, padx=5, sticky="w")
+        self.update_status(self.status)
+
+    def update_status(self, status):
+        """
+        ClientUI.update_status(status)
+        Refreshes the latency status bar every second, until it's gone.
+        """
+        if not status.winfo_exists():
+            return
+        stats = self.master.latency.stats()
+        if stats["count"]:
+            status.config(text=(
+                f"Latency: {stats['last'] * 1000:.0f} ms now, "
+                f"p50 {stats['p50'] * 1000:.0f} ms, "
+                f"p95 {stats['p95'] * 1000:.0f} ms, "
+                f"p99 {stats['p99'] * 1000:.0f} ms "
+                f"({stats['count']} pings, {stats['lost']} lost)"
+            ))
+        status.after(1000, lambda: self.update_status(status))
+
     def configure_style(self):
         """
         ClientUI.configure_style()
@@ -473,8 +575,10 @@ class ClientUI():
 
         if hasattr(self, "chat_boxes"):
             for title in self.chat_boxes:
-                for i in range(3):
-                    self.chat_boxes[title][i].config(font=self.font)
+                self.chat_boxes[title].set_font(self.font)
+
+        if getattr(self, "leaderboard", None) is not None and self.leaderboard.winfo_exists():
+            self.lb_view.set_font(self.font)
 
     def configure_title(self, message, widget, color=None):
         """
@@ -590,34 +694,27 @@ class ClientUI():
             f"Python Chatroom {self.master.data['version']}",
             "Are you sure you want to exit? "
         ):
-            self.master.dead = True
             try:
                 self.master.send("/exit")
             except:
                 pass
+            self.master.core.close()
+            # Settings are saved lazily; make sure the last changes make it.
+            self.master.core.flush_data()
             try:
                 self.master.destroy()
             except:
                 pass
+            self.close_histories()
+            self.history_tmp.cleanup()
 
-    def onvsb(self, *args, title):
-        """
-        ClientUI.onvsb(*args, title)
-        This is a necessary handle for scrolling listboxes together.
-        """
-        for i in range(3):
-            self.chat_boxes[title][i].yview(*args)
-
-    def mouse_wheel(self, event, title):
+    def close_histories(self):
         """
-        ClientUI.mouse_wheel(event, title)
-        Scrolls listboxes in unison.
+        ClientUI.close_histories()
+        Closes (and deletes) the history files of every chat.
         """
-        for i in range(3):
-            self.chat_boxes[title][i].yview(
-                "scroll", -event.delta // 20, "units")
-
-        return "break"
+        for chat_history in self.histories.values():
+            chat_history.close()
 
     def edit_color(self, color):
         """
@@ -634,6 +731,21 @@ class ClientUI():
         elif color == "personal":
             self.personal_color = tk.colorchooser.askcolor(
                 parent=self.master, title="Choose Your Personal color")[1]
+        self.update_kind_colors()
+
+    def update_kind_colors(self):
+        """
+        ClientUI.update_kind_colors()
+        Tells the chat views about the current colors. Messages already
+            there change color too.
+        """
+        self.kind_colors.update({
+            messages.Kind.WHISPER: self.whisper_color,
+            messages.Kind.ERROR: self.error_color,
+            messages.Kind.OWN: self.personal_color,
+        })
+        for view in getattr(self, "chat_boxes", {}).values():
+            view.refresh()
 
     def close_notification(self, notification_window):
         """
@@ -663,7 +775,7 @@ class ClientUI():
 
         label = ttk.Label(ip_info_win)
         label.config(justify="left")
-        server_info = self.master.server.getpeername()
+        server_info = self.master.conn.peername()
         label["text"] = "\n".join((
             f"Local IP: {self.master.local_ip}, Port: {self.master.port}",
             f"Server IP: {server_info[0]}, Port: {server_info[1]}"
@@ -757,71 +869,217 @@ class ClientUI():
 
     def create_leaderboard(self):
         """
-        ClientUI.leaderboard(update=False)
+        ClientUI.create_leaderboard()
         Create a new window for the leaderboard.
+        The rows come from the ChatClient's leaderboard.Leaderboard, and
+            only the ones on screen get drawn. Whatever board we have shows
+            up right away; the server only gets asked if it's old.
         """
+        cache = self.master.core.leaderboard_cache
+        if getattr(self, "leaderboard", None) is not None and self.leaderboard.winfo_exists():
+            self.leaderboard.lift()
+            cache.request()
+            return
+
+        board = cache.request()
         self.leaderboard = tk.Toplevel(self.master, bg=self.bg)
         self.top_levels.add(self.leaderboard)
         self.leaderboard.transient(self.master)
         self.leaderboard.title("Mining Leaderboard")
         # self.leaderboard.iconbitmap(self.icon_dir)
-        self.leaderboard.grid_rowconfigure(0, weight=1)
-        self.leaderboard.grid_columnconfigure(0, weight=2)
-        self.leaderboard.grid_columnconfigure(1, weight=3)
-        self.leaderboard.grid_columnconfigure(2, weight=2)
-        close_button = ttk.Button(
-            self.leaderboard, text="Close", command=self.leaderboard.destroy)
-        update_button = ttk.Button(
-            self.leaderboard, width=19, text="Update Leaderboard",
-            command=lambda event=None: self.master.send("/requestLeaderboard")
+        self.leaderboard.grid_rowconfigure(1, weight=1)
+        self.leaderboard.grid_columnconfigure(1, weight=1)
+
+        ttk.Label(self.leaderboard, text="Find user: ").grid(
+            row=0, column=0, padx=(10, 0), pady=5, sticky="w")
+        self.lb_search = ttk.Entry(self.leaderboard, font=self.font)
+        self.lb_search.grid(row=0, column=1, padx=(0, 10), pady=5, sticky="ew")
+        self.lb_search.bind("<KeyRelease>", self.search_leaderboard)
+        self.lb_search.bind("<Return>", self.next_leaderboard_match)
+        self.lb_prefix = ""
+        self.lb_matches = []
+
+        self.lb_view = chat_view.LeaderboardView(
+            self.leaderboard, board, self.font, self.fg, self.bg)
+        self.lb_view.colors[self.master.username] = self.personal_color
+        self.lb_view.grid(
+            row=1, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
+
+        self.lb_rank = ttk.Label(self.leaderboard, font=self.s_font)
+        self.lb_rank.grid(row=2, column=0, columnspan=2, padx=10, sticky="w")
+        self.show_rank()
+
+        buttons = tk.Frame(self.leaderboard, bg=self.bg)
+        ttk.Button(
+            buttons, width=19, text="Update Leaderboard",
+            command=lambda event=None: cache.request(force=True)
+        ).grid(row=0, column=0, padx=5)
+        ttk.Button(
+            buttons, text="Find Me",
+            command=lambda: self.jump_leaderboard(self.master.username)
+        ).grid(row=0, column=1, padx=5)
+        ttk.Button(
+            buttons, text="Close", command=self.leaderboard.destroy
+        ).grid(row=0, column=2, padx=5)
+        buttons.grid(row=3, column=0, columnspan=2, pady=5)
+
+    def update_leaderboard(self, changed):
+        """
+        ClientUI.update_leaderboard(changed)
+        The leaderboard changed between positions changed[0] and changed[1].
+        The window redraws those if they're showing; otherwise there's
+            nothing to do.
+        """
+        if getattr(self, "leaderboard", None) is None or not self.leaderboard.winfo_exists():
+            return
+        self.lb_view.changed(*changed)
+        self.show_rank()
+
+    def show_rank(self):
+        """
+        ClientUI.show_rank()
+        Puts our own rank (and how old the board is) under the leaderboard.
+        """
+        board = self.master.core.leaderboard
+        age = self.master.core.leaderboard_cache.age()
+        updated = "never updated" if age is None else f"updated {int(age)} s ago"
+        # The network thread could change it between looking and reading.
+        with board.lock:
+            rank = board.rank(self.master.username)
+            total = len(board)
+            coins = board.get(rank - 1)[2] if rank is not None else None
+        if rank is None:
+            self.lb_rank["text"] = f"You're not on the board yet. ({total} users, {updated})"
+        else:
+            self.lb_rank["text"] = f"You: #{rank} of {total}, with {coins} coins. ({updated})"
+
+    def search_leaderboard(self, event=None):
+        """
+        ClientUI.search_leaderboard(event = None)
+        Handle for typing in the leaderboard's search box.
+        Highlights users whose names start with what's typed and jumps to
+            the best ranked one.
+        """
+        prefix = self.lb_search.get()
+        if prefix == self.lb_prefix:
+            return
+        self.lb_prefix = prefix
+        for username in self.lb_matches:
+            self.lb_view.colors.pop(username, None)
+        self.lb_matches = [
+            username for _, username, _ in
+            self.master.core.leaderboard.search(prefix)
+        ] if prefix else []
+        for username in self.lb_matches:
+            self.lb_view.colors[username] = self.whisper_color
+        # We stay our own color.
+        self.lb_view.colors[self.master.username] = self.personal_color
+        if self.lb_matches:
+            self.jump_leaderboard(self.lb_matches[0])
+        self.lb_view.refresh()
+
+    def next_leaderboard_match(self, event=None):
+        """
+        ClientUI.next_leaderboard_match(event = None)
+        Handle for Enter in the search box: on to the next match.
+        """
+        if self.lb_matches:
+            self.lb_matches.append(self.lb_matches.pop(0))
+            self.jump_leaderboard(self.lb_matches[0])
+
+    def jump_leaderboard(self, username):
+        """
+        ClientUI.jump_leaderboard(username)
+        Scrolls the leaderboard to somebody.
+        """
+        rank = self.master.core.leaderboard.rank(username)
+        if rank is not None:
+            self.lb_view.see(rank - 1)
+
+    def create_search(self):
+        """
+        ClientUI.create_search()
+        A window for searching everything said since we logged in.
+        Picking a result shows it in its chat.
+        """
+        if getattr(self, "search_window", None) is not None and self.search_window.winfo_exists():
+            self.search_window.lift()
+            self.search_entry.focus_set()
+            return
+
+        self.search_window = tk.Toplevel(self.master, bg=self.bg)
+        self.top_levels.add(self.search_window)
+        self.search_window.transient(self.master)
+        self.search_window.title("Search Chats")
+        # self.search_window.iconbitmap(self.icon_dir)
+        self.search_window.grid_rowconfigure(2, weight=1)
+        self.search_window.grid_columnconfigure(0, weight=1)
+
+        self.search_entry = ttk.Entry(self.search_window, width=60, font=self.font)
+        self.search_entry.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="ew")
+        self.search_entry.bind("<KeyRelease>", self.run_search)
+        self.search_entry.bind("<Return>", self.show_result)
+        self.search_entry.focus_set()
+        self.search_query = ""
+        self.search_results = []
+
+        self.search_count = ttk.Label(
+            self.search_window, font=self.s_font,
+            text="Words, and any of from:user in:chat since:1h before:2d"
         )
+        self.search_count.grid(row=1, column=0, padx=10, sticky="w")
 
-        self.lb_ranks = tk.Listbox(self.leaderboard)
-        self.lb_names = tk.Listbox(self.leaderboard)
-        self.lb_coins = tk.Listbox(self.leaderboard)
-        for x in [self.lb_ranks, self.lb_names, self.lb_coins]:
-            x.config(
-                width=20, height=20, font=self.font,
-                relief="solid", bd=0, highlightthickness=0, fg="#000000"
-            )
+        self.search_list = tk.Listbox(
+            self.search_window, width=80, height=15, font=self.font,
+            relief="solid", bd=0, highlightthickness=0, fg=self.fg,
+            activestyle="none"
+        )
+        self.search_list.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
+        self.search_list.bind("<<ListboxSelect>>", self.show_result)
 
-        self.lb_ranks.grid(row=0, column=0, padx=(
-            10, 10), pady=5, sticky="news")
-        self.lb_names.grid(row=0, column=1, pady=5, sticky="news")
-        self.lb_coins.grid(row=0, column=2, padx=(
-            10, 10), pady=5, sticky="news")
-        close_button.grid(row=1, column=1, pady=5, columnspan=1)
-        update_button.grid(row=1, column=0, pady=5, columnspan=1)
-
-        self.lb_ranks.insert(0, "Rank")
-        self.lb_names.insert(0, "User")
-        self.lb_coins.insert(0, "Coins")
-        for i in (self.lb_ranks, self.lb_names, self.lb_coins):
-            i.config(state="disabled")
-        self.master.send("/requestLeaderboard")
-
-    def update_leaderboard(self, raw_str):
-        """
-        ClientUI.update_leaderboard(raw_str)
-        Updates the leaderboard with a raw string.
-        """
-        if not hasattr(self, "lb_ranks"):
-            self.create_leaderboard()
-        info = [
-            i.split(",")
-            for i in raw_str.split(" ")
-        ]
-        for i in (self.lb_ranks, self.lb_names, self.lb_coins):
-            i.config(state="normal")
-            i.delete(1, "end")
+        ttk.Button(
+            self.search_window, text="Close", command=self.search_window.destroy
+        ).grid(row=3, column=0, pady=5)
 
-        for i in range(len(info)):
-            self.lb_ranks.insert("end", i + 1)
-            self.lb_names.insert("end", info[i][0])
-            self.lb_coins.insert("end", info[i][1])
+    def run_search(self, event=None, limit=200):
+        """
+        ClientUI.run_search(event = None, limit = 200)
+        Handle for typing in the search box. Lists the newest limit matches.
+        """
+        query = self.search_entry.get()
+        if query == self.search_query:
+            return
+        self.search_query = query
+        self.search_results = self.search_index.query(query, limit) if query.strip() else []
+
+        self.search_list.delete(0, "end")
+        for tab, position, when in self.search_results:
+            record = self.chat_boxes[tab].store.get(position)
+            if record is not None:
+                self.search_list.insert(
+                    "end",
+                    f"[{tab}] {time.strftime('%H:%M', time.localtime(when))} "
+                    f"{record.username}> {record.text}"
+                )
+            else:
+                self.search_list.insert("end", f"[{tab}] (gone)")
+        found = len(self.search_results)
+        self.search_count["text"] = f"{found}{'+' * (found == limit)} results"
 
-        for i in (self.lb_ranks, self.lb_names, self.lb_coins):
-            i.config(state="disabled")
+    def show_result(self, event=None):
+        """
+        ClientUI.show_result(event = None)
+        Shows the picked (or first) search result in its chat.
+        """
+        if not self.search_results:
+            return
+        picked = self.search_list.curselection()
+        tab, position, _ = self.search_results[picked[0] if picked else 0]
+        self.chats.select(self.chat_frames[tab])
+        for view in self.chat_boxes.values():
+            if view.marked is not None:
+                view.mark(None)
+        self.chat_boxes[tab].mark(position)
 
     def del_account(self):
         """
@@ -926,6 +1184,97 @@ class ClientUI():
         self.cpwin.bind("<Return>", try_change_pass)
 
 
+def safe_name(title):
+    """
+    safe_name(title) -> str
+    Makes a chat title safe to use as a file name.
+    """
+    return "".join(c if c.isalnum() else f"_{ord(c):x}_" for c in title)
+
+
+class DispatchQueue:
+    """
+    The only way the network side should touch the UI.
+    tkinter isn't thread-safe, so other threads push messages (and
+        the odd function call) in here, and the Tk thread drains them
+        every few milliseconds with after().
+    Consecutive messages go through ClientUI.insert_many together,
+        so a burst of a thousand lines is one redraw, in arrival order.
+    """
+
+    def __init__(self, ui, interval=30, batch_size=5000):
+        """
+        DispatchQueue.__init__(ui, interval=30, batch_size=5000) -> DispatchQueue
+        interval is how often to drain, in milliseconds.
+        batch_size is the most items handled per drain, so a flood
+            can't freeze the window.
+        """
+        self.ui = ui
+        self.interval = interval
+        self.batch_size = batch_size
+        # deque appends and pops are atomic, so no lock needed.
+        self.queue = collections.deque()
+
+    def put(self, message):
+        """
+        DispatchQueue.put(message)
+        Queues a message (a line or a messages.Message) for
+            ClientUI.insert. Safe from any thread.
+        """
+        self.queue.append((None, message))
+
+    def call(self, func, *args):
+        """
+        DispatchQueue.call(func, *args)
+        Queues func(*args) to be run on the Tk thread. Safe from any thread.
+        """
+        self.queue.append((func, args))
+
+    def start(self):
+        """
+        DispatchQueue.start()
+        Starts draining. Call this from the Tk thread.
+        """
+        self.ui.master.after(self.interval, self.drain)
+        metrics.gauge("ui_dispatch_queue", self.queue.__len__)
+
+    def drain(self):
+        """
+        DispatchQueue.drain()
+        Handles what's queued, keeping the order, and schedules itself again.
+        """
+        batch = []
+        for _ in range(min(len(self.queue), self.batch_size)):
+            func, args = self.queue.popleft()
+            if func is None:
+                batch.append(args)
+                continue
+            if batch:
+                self.run(self.ui.insert_many, (batch,))
+                batch = []
+            self.run(func, args)
+        if batch:
+            self.run(self.ui.insert_many, (batch,))
+
+        try:
+            self.ui.master.after(self.interval, self.drain)
+        except tk.TclError:
+            # The window is gone.
+            pass
+
+    @staticmethod
+    def run(func, args):
+        """
+        DispatchQueue.run(func, args)
+        func(*args), so one that breaks doesn't take the rest of the batch
+            down with it.
+        """
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"UI update failed: {e}")
+
+
 class Spinbox(ttk.Entry):
     """Just in case. :)"""
 
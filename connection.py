@@ -0,0 +1,241 @@
+"""
+connection.py
+Python Chatroom
+
+The asyncio side of the client.
+Every connection in the process shares ONE event loop, which runs on a
+    daemon thread. tkinter gets the main thread (it insists), and talks to
+    the loop through submit() and run(), which are safe to call from
+    any thread.
+"""
+
+import asyncio
+import collections
+import threading
+import weakref
+
+import framing
+import metrics
+
+_loop = None
+_loop_lock = threading.Lock()
+# Every open ClientConnection, for the write_queue gauge. Weak, so the
+#     gauge never keeps a dead connection around.
+_open = weakref.WeakSet()
+
+
+def get_loop():
+    """
+    get_loop() -> asyncio.AbstractEventLoop
+    Returns the event loop for this process.
+    The first call starts it on a daemon thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="chatroom-loop", daemon=True
+            ).start()
+    return _loop
+
+
+def submit(coro):
+    """
+    submit(coro) -> concurrent.futures.Future
+    Schedules a coroutine on the shared loop from any thread.
+    Doesn't wait for it.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro, timeout=None):
+    """
+    run(coro, timeout=None)
+    Runs a coroutine on the shared loop and waits for its result.
+    Don't call this from the loop itself, it will wait forever.
+    """
+    return submit(coro).result(timeout)
+
+
+def write_queue():
+    """
+    write_queue() -> int
+    Writes waiting to go out, over every open connection.
+    """
+    return sum(conn.outbox.qsize() for conn in list(_open))
+
+
+metrics.gauge("write_queue", write_queue)
+
+
+class ClientConnection:
+    """
+    One TCP connection to the server.
+    Reading happens in a reader task that hands complete frames to a
+        callback, and writing goes through a queue that a single writer
+        task empties, so write() can be called from anywhere.
+    """
+
+    def __init__(self, host, port, recv_size=1 << 18):
+        """
+        ClientConnection.__init__(host, port, recv_size=1 << 18) -> ClientConnection
+        Makes a new, not yet open, connection.
+        Nothing happens until open() is awaited.
+        """
+        self.host = host
+        self.port = port
+        self.recv_size = recv_size
+        self.loop = get_loop()
+        self.decoder = framing.FrameDecoder()
+        self.reader = None
+        self.writer = None
+        self.outbox = None
+        self.frames = collections.deque()
+        self.write_task = None
+        self.read_task = None
+        self.closed = False
+        self.bytes_received = metrics.counter("bytes_received")
+        self.frames_received = metrics.counter("frames_received")
+        self.bytes_sent = metrics.counter("bytes_sent")
+
+    async def open(self):
+        """
+        ClientConnection.open()
+        Connects to the server and starts the writer task.
+        Raises OSError if the server can't be reached.
+        """
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+        self.outbox = asyncio.Queue()
+        self.write_task = asyncio.ensure_future(self.write_loop())
+        _open.add(self)
+
+    def write(self, data):
+        """
+        ClientConnection.write(data)
+        Queues raw bytes for the writer task.
+        Safe to call from any thread.
+        """
+        if self.closed or self.outbox is None:
+            return
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, data)
+
+    async def write_loop(self):
+        """
+        ClientConnection.write_loop()
+        The writer task. Sends queued bytes in order until it finds a None.
+        Everything queued by the time it wakes up goes out in one write.
+        """
+        while True:
+            chunks = [await self.outbox.get()]
+            while chunks[-1] is not None and not self.outbox.empty():
+                chunks.append(self.outbox.get_nowait())
+            stop = chunks[-1] is None
+            if stop:
+                chunks.pop()
+            if chunks:
+                # The transport keeps whatever the socket doesn't take,
+                #     and drain() waits for it, so nothing is cut short.
+                data = b"".join(chunks)
+                self.writer.write(data)
+                self.bytes_sent.inc(len(data))
+                await self.writer.drain()
+            if stop:
+                break
+
+    async def read_raw(self):
+        """
+        ClientConnection.read_raw() -> bytes
+        Reads whatever is there, unframed.
+        Only for the handshake, where the server key comes in plaintext.
+        """
+        return await self.reader.read(self.recv_size)
+
+    async def read_frame(self, data=b""):
+        """
+        ClientConnection.read_frame(data=b"") -> bytes
+        Waits for the next complete frame.
+        data is anything already read that belongs to the frame stream.
+        Raises ConnectionError if the server hangs up first.
+        """
+        if data:
+            self.frames.extend(self.decoder.feed(data))
+        while not self.frames:
+            data = await self.reader.read(self.recv_size)
+            if not data:
+                raise ConnectionError("Server closed the connection.")
+            self.frames.extend(self.decoder.feed(data))
+        return self.frames.popleft()
+
+    def start(self, on_frame, on_close):
+        """
+        ClientConnection.start(on_frame, on_close)
+        Starts the reader task.
+        on_frame(frame) is called for every frame, on the loop thread.
+        on_close(error) is called once when the connection goes away;
+            error is None if we closed it ourselves.
+        """
+        self.read_task = asyncio.ensure_future(
+            self.read_loop(on_frame, on_close)
+        )
+
+    async def read_loop(self, on_frame, on_close):
+        """
+        ClientConnection.read_loop(on_frame, on_close)
+        The reader task.
+        """
+        error = None
+        try:
+            while self.frames:
+                on_frame(self.frames.popleft())
+            while True:
+                data = await self.reader.read(self.recv_size)
+                if not data:
+                    raise ConnectionError("Server closed the connection.")
+                self.bytes_received.inc(len(data))
+                frames = self.decoder.feed(data)
+                self.frames_received.inc(len(frames))
+                for frame in frames:
+                    on_frame(frame)
+
+        except asyncio.CancelledError:
+            pass
+
+        except Exception as e:
+            error = e
+
+        if not self.closed:
+            on_close(error)
+
+    async def close(self):
+        """
+        ClientConnection.close()
+        Sends whatever is still queued, then closes the socket.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        _open.discard(self)
+        current = asyncio.current_task()
+        if self.write_task is not None and self.write_task is not current:
+            # Let the writer finish what's queued, including writes other
+            #     threads have handed over but the loop hasn't seen yet.
+            await asyncio.sleep(0)
+            self.outbox.put_nowait(None)
+            try:
+                await asyncio.wait_for(self.write_task, 5)
+            except (Exception, asyncio.CancelledError):
+                pass
+        if self.read_task is not None and self.read_task is not current:
+            self.read_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    def peername(self):
+        """
+        ClientConnection.peername() -> tuple
+        The (ip, port) of the server.
+        """
+        return self.writer.get_extra_info("peername")
@@ -0,0 +1,103 @@
+"""
+datastore.py
+Python Chatroom
+
+data.json used to be rewritten every time anything changed, on
+    whatever thread changed it. A miner getting /balance after /balance
+    meant a file write after file write.
+Now changes just mark the data dirty. It gets written at most once per
+    interval, on a worker thread, to a temporary file that then replaces
+    the real one, so a crash halfway through can't leave half a file.
+"""
+
+import json
+import os
+import threading
+
+import connection
+import metrics
+
+
+def write_atomic(path, text):
+    """
+    write_atomic(path, text)
+    Writes text to path, all or nothing.
+    """
+    temp = path + ".tmp"
+    with open(temp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def load(path, default):
+    """
+    load(path, default) -> dict
+    Reads a JSON file, writing default there first if it isn't there.
+    """
+    if not os.path.exists(path):
+        write_atomic(path, json.dumps(default))
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class DataStore:
+    """
+    Saves a dict to a JSON file, lazily.
+    """
+
+    def __init__(self, path, data, interval=2):
+        """
+        DataStore.__init__(path, data, interval=2) -> DataStore
+        data is the dict to save. It's saved as it is at writing time, so
+            keep changing the same dict.
+        interval is the most often we write, in seconds.
+        """
+        self.path = path
+        self.data = data
+        self.interval = interval
+        self.dirty = False
+        self.scheduled = False
+        self.lock = threading.Lock()
+
+    def mark_dirty(self):
+        """
+        DataStore.mark_dirty()
+        Says the data changed. It gets written within interval seconds.
+        Safe from any thread, and cheap, so call it as much as you like.
+        """
+        with self.lock:
+            self.dirty = True
+            if self.scheduled:
+                return
+            self.scheduled = True
+        loop = connection.get_loop()
+        loop.call_soon_threadsafe(loop.call_later, self.interval, self.flush_later)
+
+    def flush_later(self):
+        """
+        DataStore.flush_later()
+        The timer went off. Writing happens on a worker thread so the
+            event loop doesn't wait for the disk.
+        """
+        with self.lock:
+            self.scheduled = False
+        connection.get_loop().run_in_executor(None, self.flush)
+
+    def flush(self):
+        """
+        DataStore.flush()
+        Writes the data now if it changed since last time.
+        Blocks until it's on disk. Do this before exiting.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            try:
+                with metrics.timer("save_seconds").time():
+                    write_atomic(self.path, json.dumps(self.data))
+            except (OSError, RuntimeError, TypeError, ValueError) as e:
+                self.dirty = True
+                print(f"Could not save {self.path}: {e}")
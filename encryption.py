@@ -0,0 +1,240 @@
+"""
+encryption.py
+Python Chatroom
+
+All the RSA/AES stuff lives here. See "Encryption System" in api.md.
+
+There are two frame formats:
+    - Per-message (the original one): a fresh AES key for every message,
+        RSA-encrypted and stuck on the front. Costs one RSA operation
+        per frame, which is slow.
+    - Session: the client makes ONE AES key at login and sends it to the
+        server RSA-encrypted. After that, every frame is just a random
+        nonce and the ciphertext. Only used if the server says it can.
+
+The AES itself goes through a backend. pyaes is pure Python and slow,
+    so if a native library is installed we use that instead. They all
+    make exactly the same bytes.
+"""
+
+import os
+import time
+
+import rsa
+import pyaes
+
+import framing
+import metrics
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+try:
+    from Crypto.Cipher import AES as CryptodomeAES
+except ImportError:
+    CryptodomeAES = None
+
+KEY_LENGTH = 16
+RSA_KEY_LENGTH = 32
+NONCE_LENGTH = 16
+
+# The server adds this as a third line after its public key if it
+#     understands session frames.
+SESSION_FLAG = "session"
+
+# pyaes counts from 1 unless told otherwise, so per-message frames do too.
+DEFAULT_COUNTER = (1).to_bytes(16, "big")
+
+
+class PyaesBackend:
+    """
+    AES-CTR with pyaes. Always there, but only does a few hundred KB/s.
+    """
+    name = "pyaes"
+
+    def ctr(self, key, counter, data):
+        """
+        PyaesBackend.ctr(key, counter, data) -> bytes
+        Encrypts (or decrypts, it's the same thing) data with AES-CTR,
+            starting from the 16-byte counter block.
+        """
+        counter = pyaes.Counter(int.from_bytes(counter, "big"))
+        return pyaes.AESModeOfOperationCTR(key, counter).encrypt(data)
+
+
+class CryptographyBackend:
+    """
+    AES-CTR with the cryptography package (OpenSSL underneath).
+    """
+    name = "cryptography"
+
+    def ctr(self, key, counter, data):
+        """
+        CryptographyBackend.ctr(key, counter, data) -> bytes
+        Same as PyaesBackend.ctr, only a lot faster.
+        """
+        encryptor = Cipher(algorithms.AES(key), modes.CTR(counter)).encryptor()
+        return encryptor.update(data) + encryptor.finalize()
+
+
+class CryptodomeBackend:
+    """
+    AES-CTR with pycryptodome.
+    """
+    name = "pycryptodome"
+
+    def ctr(self, key, counter, data):
+        """
+        CryptodomeBackend.ctr(key, counter, data) -> bytes
+        Same as PyaesBackend.ctr, only a lot faster.
+        """
+        cipher = CryptodomeAES.new(
+            key, CryptodomeAES.MODE_CTR, nonce=b"", initial_value=counter)
+        return cipher.encrypt(data)
+
+
+def available_backends():
+    """
+    available_backends() -> list
+    Every backend that can run here, fastest first.
+    """
+    backends = []
+    if Cipher is not None:
+        backends.append(CryptographyBackend())
+    if CryptodomeAES is not None:
+        backends.append(CryptodomeBackend())
+    backends.append(PyaesBackend())
+    return backends
+
+
+def set_backend(name=None):
+    """
+    set_backend(name=None) -> backend
+    Picks the AES backend by name ("cryptography", "pycryptodome" or "pyaes").
+    With no name, picks the fastest one installed.
+    Raises ValueError if the one you asked for isn't installed.
+    """
+    global backend
+    for candidate in available_backends():
+        if name is None or candidate.name == name:
+            backend = candidate
+            return backend
+    raise ValueError(f"AES backend {name} is not available.")
+
+
+backend = set_backend(os.environ.get("CHATROOM_AES_BACKEND") or None)
+
+
+def to_bytes(message):
+    """
+    to_bytes(message) -> bytes
+    Messages can be str or bytes; the wire only takes bytes.
+    """
+    if isinstance(message, str):
+        return message.encode()
+    return message
+
+
+# Time spent on RSA and on AES, per frame (see metrics.py).
+rsa_timer = metrics.timer("rsa_seconds")
+aes_timer = metrics.timer("aes_seconds")
+
+
+def encrypt(message, server_key, key_length=KEY_LENGTH):
+    """
+    encrypt(message, server_key, key_length=KEY_LENGTH) -> bytes
+    Makes a per-message frame (without the delimiter).
+    A frame ending in b"\n" would blur into the delimiter
+        (see framing.is_clean), so we pick another key until it doesn't.
+    """
+    data = to_bytes(message)
+    while True:
+        key = os.urandom(key_length)
+        start = time.perf_counter()
+        header = rsa.encrypt(key, server_key)
+        middle = time.perf_counter()
+        frame = header + backend.ctr(key, DEFAULT_COUNTER, data)
+        rsa_timer.record(middle - start)
+        aes_timer.record(time.perf_counter() - middle)
+        if framing.is_clean(frame):
+            return frame
+
+
+def decrypt(frame, private_key, rsa_key_length=RSA_KEY_LENGTH):
+    """
+    decrypt(frame, private_key, rsa_key_length=RSA_KEY_LENGTH) -> str
+    Opens a per-message frame.
+    Raises an exception (rsa.DecryptionError, UnicodeDecodeError...)
+        if it's garbage.
+    """
+    start = time.perf_counter()
+    key = rsa.decrypt(frame[:rsa_key_length], private_key)
+    middle = time.perf_counter()
+    data = backend.ctr(key, DEFAULT_COUNTER, frame[rsa_key_length:])
+    rsa_timer.record(middle - start)
+    aes_timer.record(time.perf_counter() - middle)
+    return data.decode()
+
+
+class Session:
+    """
+    A negotiated symmetric key, used both ways once the server accepts it.
+    Each frame is a random 16-byte nonce followed by the AES-CTR
+        ciphertext, with the nonce as the initial counter value.
+    """
+
+    def __init__(self, key=None):
+        """
+        Session.__init__(key=None) -> Session
+        Makes a session with the given key, or a new random one.
+        """
+        self.key = key if key is not None else os.urandom(KEY_LENGTH)
+        self.header_length = NONCE_LENGTH
+
+    def offer(self, server_key):
+        """
+        Session.offer(server_key) -> bytes
+        The RSA-encrypted session key, to be sent (framed) as our
+            handshake acknowledgement.
+        """
+        while True:
+            # rsa pads randomly, so trying again gives different bytes.
+            offer = rsa.encrypt(self.key, server_key)
+            if framing.is_clean(offer):
+                return offer
+
+    @classmethod
+    def accept(cls, offer, private_key):
+        """
+        Session.accept(offer, private_key) -> Session
+        The other end of offer(): gets the key back out.
+        """
+        return cls(rsa.decrypt(offer, private_key))
+
+    def encrypt(self, message):
+        """
+        Session.encrypt(message) -> bytes
+        Makes a session frame (without the delimiter).
+        """
+        data = to_bytes(message)
+        while True:
+            # New nonces until it's clean, like encrypt().
+            nonce = os.urandom(NONCE_LENGTH)
+            start = time.perf_counter()
+            frame = nonce + backend.ctr(self.key, nonce, data)
+            aes_timer.record(time.perf_counter() - start)
+            if framing.is_clean(frame):
+                return frame
+
+    def decrypt(self, frame):
+        """
+        Session.decrypt(frame) -> str
+        Opens a session frame.
+        """
+        nonce = frame[:NONCE_LENGTH]
+        start = time.perf_counter()
+        data = backend.ctr(self.key, nonce, frame[NONCE_LENGTH:])
+        aes_timer.record(time.perf_counter() - start)
+        return data.decode()
@@ -0,0 +1,80 @@
+"""
+framing.py
+Python Chatroom
+
+Every encrypted message is followed by five newline bytes (see api.md).
+TCP doesn't care about that, though, so one recv() can give us half a
+    frame, or three and a bit. This file puts the pieces back together.
+Frames are split at the first delimiter, so a frame that starts with a
+    newline comes out whole. One that ends with a newline can't be told
+    apart from the delimiter, though, so we never send any (see is_clean).
+"""
+
+DELIMITER = b"\n" * 5
+
+
+def is_clean(frame):
+    """
+    is_clean(frame) -> bool
+    Whether a frame can go out without blurring into the delimiter:
+        it mustn't end with a newline.
+    """
+    return not frame.endswith(b"\n")
+
+
+class FrameDecoder:
+    """
+    Incremental frame decoder.
+    Feed it whatever the socket gives you and it hands back every frame
+        that is complete so far. Leftover bytes wait for the next feed.
+    """
+
+    def __init__(self, delimiter=DELIMITER):
+        """
+        FrameDecoder.__init__(delimiter=DELIMITER) -> FrameDecoder
+        Makes a new decoder with an empty receive buffer.
+        """
+        self.delimiter = delimiter
+        self.buffer = bytearray()
+        # Everything before this index has been searched already.
+        self.scanned = 0
+
+    def feed(self, data):
+        """
+        FrameDecoder.feed(data) -> list
+        Adds received bytes to the buffer and returns the complete frames,
+            without their delimiters, in the order they arrived.
+        Only the new bytes (plus a delimiter's worth of overlap) are searched.
+        """
+        self.buffer += data
+        frames = []
+        view = memoryview(self.buffer)
+        start = 0
+        search = max(self.scanned - len(self.delimiter) + 1, 0)
+        while True:
+            end = self.buffer.find(self.delimiter, search)
+            if end == -1:
+                break
+            frames.append(bytes(view[start:end]))
+            start = search = end + len(self.delimiter)
+        view.release()
+
+        if start:
+            del self.buffer[:start]
+        self.scanned = len(self.buffer)
+        return frames
+
+    def pending(self):
+        """
+        FrameDecoder.pending() -> int
+        How many bytes are waiting for the rest of their frame.
+        """
+        return len(self.buffer)
+
+    def clear(self):
+        """
+        FrameDecoder.clear()
+        Throws away anything half-received, like after a reconnect.
+        """
+        self.buffer.clear()
+        self.scanned = 0
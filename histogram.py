@@ -0,0 +1,108 @@
+"""
+histogram.py
+Python Chatroom
+
+A histogram for timings: the median, 95th and 99th percentiles of any
+    number of durations, without keeping every single one. latency.py
+    keeps ping times in one, and metrics.py timers are one.
+"""
+
+import collections
+
+
+class Histogram:
+    """
+    A log-linear histogram, like HdrHistogram.
+    Values are counted in buckets that are exact below 2 ** sub_bits and
+        get wider after that, but never wider than about 1 / 2 ** (sub_bits - 1)
+        of the value, so percentiles are off by a few percent at most and it
+        only takes a few hundred buckets for anything from microseconds to
+        hours.
+    Values are seconds, counted in units (microseconds by default).
+    """
+
+    def __init__(self, sub_bits=5, unit=1e-6):
+        """
+        Histogram.__init__(sub_bits=5, unit=1e-6) -> Histogram
+        """
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.unit = unit
+        self.reset()
+
+    def reset(self):
+        """
+        Histogram.reset()
+        Forgets everything.
+        """
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        """
+        Histogram.bucket(value) -> int
+        Which bucket a value (in units) goes in.
+        """
+        exponent = value.bit_length() - self.sub_bits
+        if exponent <= 0:
+            return value
+        return exponent * self.half + (value >> exponent)
+
+    def lowest(self, bucket):
+        """
+        Histogram.lowest(bucket) -> int
+        The smallest value (in units) that goes in a bucket.
+        """
+        if bucket < 2 * self.half:
+            return bucket
+        exponent = bucket // self.half - 1
+        return (bucket - exponent * self.half) << exponent
+
+    def record(self, seconds):
+        """
+        Histogram.record(seconds)
+        Counts one value.
+        """
+        value = max(int(seconds / self.unit), 0)
+        self.buckets[self.bucket(value)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        Histogram.percentile(fraction) -> float
+        The value (in seconds) that fraction of everything is at or below,
+            like percentile(0.99). None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        wanted = max(fraction * self.count, 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= wanted:
+                # The middle of the bucket, but never past what we've seen.
+                low = self.lowest(bucket)
+                high = self.lowest(bucket + 1)
+                return min((low + high) / 2 * self.unit, self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Histogram.summary() -> dict
+        count, mean, min, p50, p95, p99 and max, in seconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
@@ -0,0 +1,136 @@
+"""
+history.py
+Python Chatroom
+
+Per-chat message history with a fixed memory budget.
+The newest messages (messages.ChatRecords) stay in memory. When there
+    are too many, the oldest get written to a segment file for that chat
+    (one packed record per line, append only), and are read back in
+    blocks only if somebody scrolls up that far. A long session costs
+    disk, not memory.
+"""
+
+import array
+import collections
+import json
+import os
+
+from chat_view import MessageRing
+from messages import ChatRecord
+
+
+class ChatHistory:
+    """
+    The message store behind a ChatView.
+    Works like MessageRing (first, end, get), except nothing is ever gone:
+        first is always 0, and old records come back from disk.
+    """
+
+    def __init__(self, path, cap=2000, block_size=256, cached_blocks=8):
+        """
+        ChatHistory.__init__(path, cap=2000, block_size=256, cached_blocks=8) -> ChatHistory
+        path is the segment file; anything already there is thrown away.
+        cap is how many records to keep in memory.
+        Old records are read back block_size at a time, and the last
+            cached_blocks blocks read are kept around.
+        """
+        self.path = path
+        self.first = 0
+        self.recent = MessageRing(cap)
+        self.block_size = block_size
+        self.cached_blocks = cached_blocks
+        self.cache = collections.OrderedDict()
+        # File offset of the start of every block_size-th spilled record.
+        self.offsets = array.array("Q")
+        self.written = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.segment = open(path, "wb")
+
+    @property
+    def end(self):
+        """
+        ChatHistory.end -> int
+        Number of the next record to be added.
+        """
+        return self.recent.end
+
+    def spilled(self):
+        """
+        ChatHistory.spilled() -> int
+        How many records are only on disk.
+        """
+        return self.recent.first
+
+    def append(self, record):
+        """
+        ChatHistory.append(record)
+        Adds a record. If memory is full, the oldest one goes to disk first.
+        """
+        if self.recent.end >= self.recent.size:
+            self.spill(self.recent.get(self.recent.first))
+        self.recent.append(record)
+
+    def spill(self, record):
+        """
+        ChatHistory.spill(record)
+        Appends a record to the segment file.
+        """
+        number, offset = divmod(self.spilled(), self.block_size)
+        if offset == 0:
+            self.offsets.append(self.written)
+        else:
+            block = self.cache.get(number)
+            if block is not None:
+                # The newest block is cached while it's still filling up;
+                #     keep it whole.
+                block.append(record)
+        line = json.dumps(record.pack()).encode() + b"\n"
+        self.segment.write(line)
+        self.written += len(line)
+
+    def get(self, index):
+        """
+        ChatHistory.get(index) -> record
+        The record with that number, from memory or from disk.
+        None if there's no such record.
+        """
+        if index < 0 or index >= self.end:
+            return None
+        if index >= self.recent.first:
+            return self.recent.get(index)
+        block = self.load_block(index // self.block_size)
+        return block[index % self.block_size]
+
+    def load_block(self, number):
+        """
+        ChatHistory.load_block(number) -> list
+        Reads one block of spilled records, or gets it from the cache.
+        """
+        if number in self.cache:
+            self.cache.move_to_end(number)
+            return self.cache[number]
+
+        self.segment.flush()
+        count = min(self.block_size, self.spilled() - number * self.block_size)
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[number])
+            block = [ChatRecord.unpack(json.loads(f.readline())) for _ in range(count)]
+        # The newest block may still be filling up; spill() adds to it.
+        self.cache[number] = block
+        if len(self.cache) > self.cached_blocks:
+            self.cache.popitem(last=False)
+        return block
+
+    def close(self, delete=True):
+        """
+        ChatHistory.close(delete=True)
+        Closes the segment file, and deletes it unless told not to.
+        """
+        self.segment.close()
+        if delete:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
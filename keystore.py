@@ -0,0 +1,120 @@
+"""
+keystore.py
+Python Chatroom
+
+Making an RSA keypair takes a while, and we used to do it every single
+    time the client started. Now we make one, save it next to data.json,
+    and load it next time.
+If you want fresh keys every now and then, give KeyStore a rotation
+    interval. Bots that need lots of keys quickly can use a KeyPool,
+    which makes them ahead of time on a background thread.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import rsa
+
+
+class KeyPool:
+    """
+    Makes keypairs in the background so they're ready when needed.
+    """
+
+    def __init__(self, bits=256, size=4):
+        """
+        KeyPool.__init__(bits=256, size=4) -> KeyPool
+        Starts a daemon thread that keeps up to size keypairs ready.
+        """
+        self.bits = bits
+        self.keys = queue.Queue(maxsize=size)
+        self.thread = threading.Thread(
+            target=self.fill, name="keypool", daemon=True)
+        self.thread.start()
+
+    def fill(self):
+        """
+        KeyPool.fill()
+        The background thread. Blocks whenever the pool is full.
+        """
+        while True:
+            self.keys.put(rsa.newkeys(self.bits))
+
+    def get(self):
+        """
+        KeyPool.get() -> (rsa.PublicKey, rsa.PrivateKey)
+        Takes a ready keypair, or waits for the next one.
+        """
+        return self.keys.get()
+
+
+class KeyStore:
+    """
+    Loads our RSA keypair from disk, or makes and saves one.
+    """
+
+    def __init__(self, path="keys.json", bits=256, rotate_after=None, pool=None):
+        """
+        KeyStore.__init__(path="keys.json", bits=256, rotate_after=None, pool=None) -> KeyStore
+        rotate_after is the most age a saved keypair can have, in seconds,
+            before we replace it. None means keep it forever.
+        pool is an optional KeyPool to take new keypairs from.
+        """
+        self.path = path
+        self.bits = bits
+        self.rotate_after = rotate_after
+        self.pool = pool
+
+    def load(self):
+        """
+        KeyStore.load() -> (rsa.PublicKey, rsa.PrivateKey)
+        Returns the saved keypair if it's there, usable and not too old.
+        Otherwise makes a new one and saves it.
+        """
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+            private_key = rsa.PrivateKey.load_pkcs1(
+                saved["privateKey"].encode())
+            too_old = (
+                self.rotate_after is not None
+                and time.time() - saved["created"] > self.rotate_after
+            )
+            if private_key.n.bit_length() == self.bits and not too_old:
+                return rsa.PublicKey(private_key.n, private_key.e), private_key
+
+        except (OSError, ValueError, KeyError):
+            # Missing or broken file, make a new one.
+            pass
+
+        return self.generate()
+
+    def generate(self):
+        """
+        KeyStore.generate() -> (rsa.PublicKey, rsa.PrivateKey)
+        Makes a new keypair and saves it, replacing the old one.
+        """
+        print("Generating encryption keys...")
+        if self.pool is not None:
+            public_key, private_key = self.pool.get()
+        else:
+            public_key, private_key = rsa.newkeys(self.bits)
+        self.save(private_key)
+        return public_key, private_key
+
+    def save(self, private_key):
+        """
+        KeyStore.save(private_key)
+        Writes the keypair to disk. Only we should be able to read it.
+        """
+        temp = self.path + ".tmp"
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "created": time.time(),
+                "privateKey": private_key.save_pkcs1().decode()
+            }, f)
+        os.replace(temp, self.path)
@@ -0,0 +1,138 @@
+"""
+latency.py
+Python Chatroom
+
+Keeps an eye on how long the server takes to answer.
+A LatencyMonitor sends "/ping #<seq>" every few seconds. The server
+    sends pings straight back, so when "/ping #<seq>" comes back we know
+    exactly which probe it was and how long it took. The times go into a
+    histogram.Histogram, which can tell you the median, 95th and 99th
+    percentiles without keeping every single time.
+Probe replies never show up in the chat; ChatClient leaves them alone.
+"""
+
+import asyncio
+import threading
+import time
+
+import connection
+import messages
+from histogram import Histogram
+
+# Probes look like "/ping #12".
+PROBE_TAG = "#"
+
+
+class LatencyMonitor:
+    """
+    Pings the server on a schedule and keeps track of the round trips.
+    """
+
+    def __init__(self, client, interval=5, timeout=30):
+        """
+        LatencyMonitor.__init__(client, interval=5, timeout=30) -> LatencyMonitor
+        client is a ChatClient. interval is seconds between probes.
+        A probe that isn't back after timeout seconds counts as lost.
+        """
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.histogram = Histogram()
+        # on_ping records on the event loop while stats() reads from
+        #     wherever (the Tk thread, say).
+        self.lock = threading.Lock()
+        self.sequence = 0
+        # seq -> when it went out.
+        self.pending = {}
+        self.lost = 0
+        self.last = None
+        self.task = None
+        client.register(messages.PING, self.on_ping)
+
+    def start(self):
+        """
+        LatencyMonitor.start()
+        Starts probing. Safe from any thread.
+        """
+        connection.get_loop().call_soon_threadsafe(self.begin)
+
+    def begin(self):
+        """
+        LatencyMonitor.begin()
+        start(), on the event loop.
+        """
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        """
+        LatencyMonitor.run()
+        Sends a probe every interval seconds.
+        """
+        while True:
+            self.probe()
+            await asyncio.sleep(self.interval)
+
+    def probe(self):
+        """
+        LatencyMonitor.probe()
+        Sends one probe, straight to the connection so that waiting to be
+            merged with other messages doesn't count as latency.
+        """
+        now = time.perf_counter()
+        for sequence, sent in list(self.pending.items()):
+            if now - sent > self.timeout:
+                del self.pending[sequence]
+                self.lost += 1
+
+        client = self.client
+        if client.dead or client.conn is None:
+            return
+        self.sequence += 1
+        self.pending[self.sequence] = now
+        client.conn.write(client.encrypt(f"/ping {PROBE_TAG}{self.sequence}"))
+
+    def on_ping(self, record):
+        """
+        LatencyMonitor.on_ping(record)
+        Handler for pings coming back. Only our probes count.
+        """
+        if not record.args or not record.args[0].startswith(PROBE_TAG):
+            return
+        try:
+            sent = self.pending.pop(int(record.args[0][len(PROBE_TAG):]))
+        except (KeyError, ValueError):
+            # Not ours, or it took so long we gave up on it.
+            return
+        self.last = time.perf_counter() - sent
+        with self.lock:
+            self.histogram.record(self.last)
+
+    def stats(self):
+        """
+        LatencyMonitor.stats() -> dict
+        The histogram summary (seconds), plus the last round trip and
+            how many probes were lost.
+        """
+        with self.lock:
+            stats = self.histogram.summary()
+        stats["last"] = self.last
+        stats["lost"] = self.lost
+        return stats
+
+    def stop(self):
+        """
+        LatencyMonitor.stop()
+        Stops probing. Safe from any thread.
+        """
+        connection.get_loop().call_soon_threadsafe(self.end)
+
+    def end(self):
+        """
+        LatencyMonitor.end()
+        stop(), on the event loop.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.pending.clear()
@@ -0,0 +1,316 @@
+"""
+leaderboard.py
+Python Chatroom
+
+The mining leaderboard, kept sorted in memory.
+The server always sends the whole table as one "/update_leaderboard"
+    line. The window used to clear three Listboxes and put every row
+    back in, which froze everything once there were a few thousand
+    accounts. Now the table lives here, keyed by username: an update
+    only moves the rows that actually changed, and the window
+    (chat_view.LeaderboardView) only draws the rows you can see.
+It also knows everybody's rank, so "where am I?" and "find users
+    starting with..." don't have to look through the whole thing.
+LeaderboardCache decides when it's worth asking the server again: the
+    board counts as fresh for a while after it arrives, opening the window
+    just shows what we have (and asks for a new one if it's old), and a
+    timer can keep it from getting too old in the first place.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+
+import connection
+
+
+def parse(entries):
+    """
+    parse(entries) -> dict
+    Turns ["user,coins", ...] (the words after /update_leaderboard)
+        into {user: coins}. Anything that doesn't look right is skipped.
+    """
+    table = {}
+    for entry in entries:
+        username, _, coins = entry.partition(",")
+        # "Bob,100," happens (see api.md), so only up to the next comma.
+        coins = coins.partition(",")[0]
+        if not username:
+            continue
+        try:
+            table[username] = int(coins)
+        except ValueError:
+            try:
+                table[username] = float(coins)
+            except ValueError:
+                continue
+    return table
+
+
+class Leaderboard:
+    """
+    Everybody's coins, sorted richest first (ties by username).
+    Works as a store for chat_view.VirtualList (first, end, get), where
+        record number i is rank i + 1 and comes out as (rank, username, coins).
+    Updates can come from any thread; everything takes a lock.
+    """
+
+    def __init__(self):
+        """
+        Leaderboard.__init__() -> Leaderboard
+        """
+        self.coins = {}
+        # (-coins, username), sorted. Position in here is rank - 1.
+        self.order = []
+        # (username.casefold(), username), sorted, for prefix search.
+        self.names = []
+        self.first = 0
+        self.lock = threading.RLock()
+
+    @property
+    def end(self):
+        """
+        Leaderboard.end -> int
+        How many people are on the board.
+        """
+        return len(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def get(self, index):
+        """
+        Leaderboard.get(index) -> (rank, username, coins)
+        Whoever's at that position (rank index + 1), or None.
+        """
+        with self.lock:
+            if 0 <= index < len(self.order):
+                coins, username = self.order[index]
+                return index + 1, username, -coins
+        return None
+
+    def update(self, entries):
+        """
+        Leaderboard.update(entries) -> (low, high) or None
+        Makes the board match a whole table from the server (the words
+            after /update_leaderboard). People missing from it are dropped.
+        Returns the range of positions that might look different now
+            (high not included), or None if nothing changed.
+        """
+        table = parse(entries)
+        with self.lock:
+            changed = {
+                username: coins for username, coins in table.items()
+                if self.coins.get(username) != coins
+            }
+            removed = [username for username in self.coins if username not in table]
+            if not changed and not removed:
+                return None
+
+            # If most of it changed, sorting again is quicker than moving
+            #     everybody one at a time.
+            if len(changed) + len(removed) > len(self.order) // 4:
+                old_end = len(self.order)
+                self.coins = table
+                self.order = sorted((-coins, username) for username, coins in table.items())
+                self.names = sorted((username.casefold(), username) for username in table)
+                return 0, max(old_end, len(self.order))
+
+            low, high = len(self.order), 0
+            for username in removed:
+                low, high = self.widen(low, high, self.remove(username))
+            for username, coins in changed.items():
+                low, high = self.widen(low, high, self.place(username, coins))
+            return low, high
+
+    def set(self, username, coins):
+        """
+        Leaderboard.set(username, coins) -> (low, high) or None
+        Changes one person's coins (adding them if they're new), without
+            waiting for the server to send the whole table.
+        Returns what update() does.
+        """
+        with self.lock:
+            if self.coins.get(username) == coins:
+                return None
+            return self.place(username, coins)
+
+    def place(self, username, coins):
+        """
+        Leaderboard.place(username, coins) -> (low, high)
+        Moves (or adds) one person to where their coins put them.
+        Call with the lock held.
+        """
+        old = self.coins.get(username)
+        if old is None:
+            bisect.insort(self.names, (username.casefold(), username))
+            start, end = len(self.order), len(self.order) + 1
+        else:
+            start = bisect.bisect_left(self.order, (-old, username))
+            del self.order[start]
+            end = start + 1
+        self.coins[username] = coins
+        position = bisect.bisect_left(self.order, (-coins, username))
+        self.order.insert(position, (-coins, username))
+        # Everybody between the old spot and the new one moved by one.
+        return min(start, position), max(end, position + 1)
+
+    def remove(self, username):
+        """
+        Leaderboard.remove(username) -> (low, high)
+        Takes somebody off the board. Call with the lock held.
+        """
+        coins = self.coins.pop(username)
+        position = bisect.bisect_left(self.order, (-coins, username))
+        del self.order[position]
+        name = bisect.bisect_left(self.names, (username.casefold(), username))
+        del self.names[name]
+        # Everybody below them moved up.
+        return position, len(self.order) + 1
+
+    @staticmethod
+    def widen(low, high, span):
+        """
+        Leaderboard.widen(low, high, span) -> (low, high)
+        The smallest range covering both.
+        """
+        return min(low, span[0]), max(high, span[1])
+
+    def rank(self, username):
+        """
+        Leaderboard.rank(username) -> int
+        Somebody's rank (1 is the richest), or None if they aren't on the board.
+        """
+        with self.lock:
+            coins = self.coins.get(username)
+            if coins is None:
+                return None
+            return bisect.bisect_left(self.order, (-coins, username)) + 1
+
+    def search(self, prefix, limit=50):
+        """
+        Leaderboard.search(prefix, limit=50) -> list
+        (rank, username, coins) for up to limit people whose usernames start
+            with prefix (not caring about case), best rank first.
+        """
+        prefix = prefix.casefold()
+        with self.lock:
+            index = bisect.bisect_left(self.names, (prefix,))
+            found = []
+            while index < len(self.names) and self.names[index][0].startswith(prefix):
+                found.append(self.names[index][1])
+                index += 1
+            found = sorted((-self.coins[username], username) for username in found)
+            return [
+                (bisect.bisect_left(self.order, key) + 1, key[1], -key[0])
+                for key in found[:limit]
+            ]
+
+
+class LeaderboardCache:
+    """
+    When to send /requestLeaderboard for a ChatClient's leaderboard.
+    Stale-while-revalidate: whoever wants the board gets it straight away,
+        however old, and if it's older than ttl seconds a new one gets
+        asked for in the background.
+    """
+
+    def __init__(self, client, ttl=60, interval=120, patience=10):
+        """
+        LeaderboardCache.__init__(client, ttl=60, interval=120, patience=10) -> LeaderboardCache
+        ttl is how many seconds a board stays fresh.
+        interval is how often (in seconds) the timer checks whether it's
+            gone stale. None or 0 means no timer.
+        patience is how long to wait for an answer before asking again.
+        """
+        self.client = client
+        self.ttl = ttl
+        self.interval = interval
+        self.patience = patience
+        # time.monotonic() of the last board from the server, and of the
+        #     last time we asked for one.
+        self.fetched = None
+        self.requested = None
+        self.task = None
+
+    def age(self):
+        """
+        LeaderboardCache.age() -> float
+        Seconds since the last board came, or None if none has.
+        """
+        if self.fetched is None:
+            return None
+        return time.monotonic() - self.fetched
+
+    def fresh(self):
+        """
+        LeaderboardCache.fresh() -> bool
+        Whether the board is new enough to not bother the server.
+        """
+        age = self.age()
+        return age is not None and age < self.ttl
+
+    def request(self, force=False):
+        """
+        LeaderboardCache.request(force=False) -> Leaderboard
+        The board, as it is now. If it's stale (or force), asks the server
+            for a new one, unless we already did and are still waiting.
+        Safe from any thread.
+        """
+        client = self.client
+        now = time.monotonic()
+        waiting = self.requested is not None and now - self.requested < self.patience
+        if not client.dead and not waiting and (force or not self.fresh()):
+            self.requested = now
+            client.send("/requestLeaderboard")
+        return client.leaderboard
+
+    def updated(self):
+        """
+        LeaderboardCache.updated()
+        The server sent a board. ChatClient calls this.
+        """
+        self.fetched = time.monotonic()
+        self.requested = None
+
+    def start(self):
+        """
+        LeaderboardCache.start()
+        Starts the refresh timer, if there's an interval. Safe from any thread.
+        """
+        if self.interval:
+            connection.get_loop().call_soon_threadsafe(self.begin)
+
+    def begin(self):
+        """
+        LeaderboardCache.begin()
+        start(), on the event loop.
+        """
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        """
+        LeaderboardCache.run()
+        Every interval seconds, asks for a new board if ours is stale.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            self.request()
+
+    def stop(self):
+        """
+        LeaderboardCache.stop()
+        Stops the timer. Safe from any thread.
+        """
+        connection.get_loop().call_soon_threadsafe(self.end)
+
+    def end(self):
+        """
+        LeaderboardCache.end()
+        stop(), on the event loop.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
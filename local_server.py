@@ -0,0 +1,462 @@
+"""
+local_server.py
+Python Chatroom
+
+A stand-in for the real chatroom server, which is private.
+It speaks the protocol from api.md well enough to run the client
+    against it: the handshake, RSA/AES frames (and session frames),
+    chatting, whispers and the commands in the "Commands" sections.
+It's meant for testing and benchmarks, not for actually hosting a
+    chatroom. Accounts only live in memory.
+
+It can also make trouble on purpose:
+    - chatter: fake users talking at a given rate
+    - fanout: only deliver each broadcast to that many clients
+    - slow reads, frames split into little pieces, dropped connections
+
+Run it with
+    python local_server.py --port 1235 --chatter 50
+or see --help. Or start a LocalServer from your own code.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import secrets
+
+import rsa
+
+import encryption
+import framing
+
+MINING_REWARD = 5
+MINING_PENALTY = -1
+PRICES = {"cookie": 1, "adminStatus": 1000}
+
+
+class Account:
+    """
+    What the server knows about one user.
+    """
+
+    def __init__(self, password):
+        """
+        Account.__init__(password) -> Account
+        password is the hash the client sends.
+        """
+        self.password = password
+        self.money = 0
+        self.cookies = 0
+        self.admin = False
+
+
+class Peer:
+    """
+    One connected client, as the server sees it.
+    """
+
+    def __init__(self, server, reader, writer):
+        """
+        Peer.__init__(server, reader, writer) -> Peer
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.decoder = framing.FrameDecoder()
+        self.username = ""
+        self.public_key = None
+        self.session = None
+        self.closed = False
+        # Frames that came in during the handshake, not handled yet.
+        self.pushback = []
+        # Split frames take several writes; others have to wait their turn.
+        self.lock = asyncio.Lock()
+
+    def encrypt(self, message):
+        """
+        Peer.encrypt(message) -> bytes
+        A frame for this client, delimiter included.
+        """
+        if self.session is not None:
+            frame = self.session.encrypt(message)
+        else:
+            frame = encryption.encrypt(message, self.public_key)
+        return frame + framing.DELIMITER
+
+    def decrypt(self, frame):
+        """
+        Peer.decrypt(frame) -> str
+        Opens a frame from this client. Raises if it's garbage.
+        """
+        if self.session is not None:
+            return self.session.decrypt(frame)
+        return encryption.decrypt(frame, self.server.private_key)
+
+    async def send(self, message):
+        """
+        Peer.send(message)
+        Encrypts and writes one message, with whatever faults are turned on.
+        """
+        if self.closed or self.writer.is_closing():
+            self.close()
+            return
+        data = self.encrypt(message)
+        server = self.server
+        server.frames_out += 1
+        if random.random() < server.drop_rate:
+            self.close()
+            return
+        try:
+            async with self.lock:
+                if random.random() < server.split_rate:
+                    # Dribble it out in little pieces.
+                    while data:
+                        cut = random.randint(1, max(len(data) // 2, 1))
+                        self.writer.write(data[:cut])
+                        data = data[cut:]
+                        await self.writer.drain()
+                        await asyncio.sleep(0.001)
+                else:
+                    self.writer.write(data)
+                    await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.close()
+
+    async def read(self):
+        """
+        Peer.read() -> bytes
+        Reads from the socket, slowly if we're told to.
+        """
+        if self.server.slow_read:
+            await asyncio.sleep(self.server.slow_read)
+        return await self.reader.read(1 << 16)
+
+    def close(self):
+        """
+        Peer.close()
+        Hangs up on this client.
+        """
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+            self.server.peers.discard(self)
+
+
+class LocalServer:
+    """
+    The stand-in server.
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=1235, session=True, zeros=4,
+        chatter=0, chatter_lines=1, fanout=None, slow_read=0,
+        split_rate=0, drop_rate=0, auto_register=True
+    ):
+        """
+        LocalServer.__init__(host="127.0.0.1", port=1235, session=True, zeros=4,
+            chatter=0, chatter_lines=1, fanout=None, slow_read=0, split_rate=0,
+            drop_rate=0, auto_register=True) -> LocalServer
+        session: offer session frames (see api.md).
+        zeros: leading zeros needed for mining.
+        chatter: fake messages per second, broadcast to everybody.
+        chatter_lines: lines per fake message (they share one frame).
+        fanout: only broadcast to this many clients. None means all.
+        slow_read: seconds to wait before every read.
+        split_rate, drop_rate: chance that a frame gets written in pieces,
+            or that the connection gets dropped instead.
+        auto_register: let unknown usernames log in without "newacc".
+        """
+        self.host = host
+        self.port = port
+        self.offer_session = session
+        self.zeros = zeros
+        self.chatter = chatter
+        self.chatter_lines = chatter_lines
+        self.fanout = fanout
+        self.slow_read = slow_read
+        self.split_rate = split_rate
+        self.drop_rate = drop_rate
+        self.auto_register = auto_register
+
+        self.public_key, self.private_key = rsa.newkeys(256)
+        self.accounts = {}
+        self.peers = set()
+        self.prev_hash = hashlib.sha512(secrets.token_bytes(16)).hexdigest()
+        self.server = None
+        self.tasks = []
+        self.frames_in = 0
+        self.frames_out = 0
+
+    async def start(self):
+        """
+        LocalServer.start()
+        Starts listening. If port was 0, self.port is the real one after this.
+        """
+        self.server = await asyncio.start_server(
+            self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.chatter:
+            self.tasks.append(asyncio.ensure_future(self.chat_loop()))
+
+    async def stop(self):
+        """
+        LocalServer.stop()
+        Stops listening and hangs up on everyone.
+        """
+        for task in self.tasks:
+            task.cancel()
+        for peer in list(self.peers):
+            peer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        """
+        LocalServer.handle(reader, writer)
+        Runs one client: handshake, then commands until they leave.
+        """
+        peer = Peer(self, reader, writer)
+        try:
+            if await self.handshake(peer):
+                self.peers.add(peer)
+                await self.serve(peer)
+        except (ConnectionError, OSError, ValueError, IndexError):
+            pass
+        finally:
+            peer.close()
+
+    async def handshake(self, peer):
+        """
+        LocalServer.handshake(peer) -> bool
+        Logging In, from api.md. Returns whether the client got in.
+        """
+        credentials = (await peer.read()).decode().split("\n")
+        peer.public_key = rsa.PublicKey(int(credentials[0]), int(credentials[1]))
+        username, password = credentials[2], credentials[3]
+        new = len(credentials) > 4 and credentials[4] == "newacc"
+
+        account = self.accounts.get(username)
+        if new and account is not None:
+            await peer.send("Server> That username is taken. ")
+            return False
+        if account is None and (new or self.auto_register):
+            account = self.accounts[username] = Account(password)
+        if account is None or account.password != password:
+            await peer.send("Server> Incorrect username or password. ")
+            return False
+        peer.username = username
+
+        key = f"{self.public_key.n}\n{self.public_key.e}"
+        if self.offer_session:
+            key += "\n" + encryption.SESSION_FLAG
+        peer.writer.write(key.encode())
+        await peer.writer.drain()
+
+        # First acknowledgement: our session key, or anything at all.
+        data = await peer.read()
+        frames = peer.decoder.feed(data)
+        if self.offer_session:
+            while not frames:
+                data = await peer.read()
+                if not data:
+                    return False
+                frames = peer.decoder.feed(data)
+            peer.session = encryption.Session.accept(frames.pop(0), self.private_key)
+        elif not frames:
+            # Not framed, so not worth keeping.
+            peer.decoder.clear()
+
+        await peer.send(
+            f"{account.money}\n{account.cookies}\n{self.prev_hash}\n{self.zeros}")
+
+        # Second acknowledgement. It isn't framed, so skip its one byte.
+        if peer.decoder.pending():
+            data = bytes(peer.decoder.buffer)
+            peer.decoder.clear()
+        else:
+            data = await peer.read()
+            if not data:
+                return False
+        frames += peer.decoder.feed(data[1:] if data.startswith(b" ") else data)
+        peer.pushback = frames
+        return True
+
+    async def serve(self, peer):
+        """
+        LocalServer.serve(peer)
+        Reads frames from a logged-in client and does what they say.
+        """
+        while not peer.closed:
+            frames, peer.pushback = peer.pushback, []
+            if not frames:
+                data = await peer.read()
+                if not data:
+                    return
+                frames = peer.decoder.feed(data)
+            for frame in frames:
+                self.frames_in += 1
+                try:
+                    message = peer.decrypt(frame)
+                except Exception:
+                    continue
+                for line in message.split("\n"):
+                    await self.command(peer, line)
+
+    async def command(self, peer, line):
+        """
+        LocalServer.command(peer, line)
+        One line from a client. See "Commands (sent to the server)" in api.md.
+        """
+        account = self.accounts[peer.username]
+        words = line.split(" ")
+
+        if line == "exit" or line == "/exit":
+            peer.close()
+
+        elif words[0] == "/w" and len(words) > 2:
+            message = " ".join(words[2:])
+            for other in list(self.peers):
+                if other.username == words[1]:
+                    await other.send(f"{peer.username}> /w {message}")
+            await peer.send(f"{peer.username}> /w To:{words[1]} {message}")
+
+        elif words[0] == "/ping":
+            await peer.send(line)
+
+        elif words[0] == "/active":
+            names = sorted({other.username for other in self.peers})
+            await peer.send("Server> Active users: \n" + "\n".join(names))
+
+        elif words[0] == "/mine" and len(words) == 2:
+            digest = hashlib.sha512((words[1] + self.prev_hash).encode()).hexdigest()
+            if len(words[1]) == 86 and digest.startswith("0" * self.zeros):
+                account.money += MINING_REWARD
+                self.prev_hash = digest
+                await peer.send(f"/balance {MINING_REWARD}")
+                await self.broadcast(f"/newHash {self.prev_hash}")
+            else:
+                account.money += MINING_PENALTY
+                await peer.send(f"/balance {MINING_PENALTY}")
+
+        elif words[0] == "/requestHash":
+            await peer.send(f"/newHash {self.prev_hash}")
+
+        elif words[0] == "/requestLeaderboard":
+            board = sorted(
+                self.accounts.items(), key=lambda item: -item[1].money)
+            await peer.send("/update_leaderboard " + " ".join(
+                f"{name},{acc.money}" for name, acc in board))
+
+        elif words[0] == "/cost" and len(words) > 1:
+            await peer.send(
+                f"Server> {words[1]} costs {PRICES.get(words[1], '???')} coins. ")
+
+        elif words[0] == "/buy" and len(words) > 1 and words[1] in PRICES:
+            count = int(words[2]) if len(words) > 2 and words[2].isdigit() else 1
+            cost = PRICES[words[1]] * count
+            if cost > account.money:
+                await peer.send("Server> /w You can't afford that. ")
+                return
+            account.money -= cost
+            await peer.send(f"/balance -{cost}")
+            if words[1] == "cookie":
+                account.cookies += count
+                await peer.send(f"/cookies {count}")
+            else:
+                account.admin = True
+
+        elif words[0] == "/a" and words[1:2] == ["/kick"] and account.admin:
+            for other in list(self.peers):
+                if other.username == words[2]:
+                    await other.send(
+                        f"Server> You have been kicked by {peer.username}. ")
+                    other.close()
+
+        elif words[0] in ("/changepass", "/newpass") and len(words) == 3:
+            if words[1] != account.password:
+                await peer.send("/e changepass Wrong password. ")
+                return
+            account.password = words[2]
+            await peer.send(
+                "Server> /w Your password has been successfully changed. ")
+
+        elif words[0] == "/delacc" and len(words) == 2:
+            if words[1] != account.password:
+                await peer.send("/e delacc Wrong password. ")
+                return
+            del self.accounts[peer.username]
+            for other in list(self.peers):
+                if other.username == peer.username:
+                    other.close()
+
+        else:
+            await self.broadcast(f"{peer.username}> {line}")
+
+    async def broadcast(self, message):
+        """
+        LocalServer.broadcast(message)
+        Sends a message to everybody (or fanout people).
+        """
+        peers = list(self.peers)
+        if self.fanout is not None:
+            peers = peers[:self.fanout]
+        await asyncio.gather(*(peer.send(message) for peer in peers))
+
+    async def chat_loop(self):
+        """
+        LocalServer.chat_loop()
+        Fake users saying things, chatter times a second.
+        """
+        number = 0
+        while True:
+            await asyncio.sleep(1 / self.chatter)
+            lines = []
+            for _ in range(self.chatter_lines):
+                number += 1
+                lines.append(f"bot{number % 10}> chatter number {number}")
+            await self.broadcast("\n".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in server for the Python Chatroom.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1235)
+    parser.add_argument("--no-session", action="store_true",
+                        help="only use per-message RSA frames")
+    parser.add_argument("--zeros", type=int, default=4,
+                        help="leading zeros needed for mining")
+    parser.add_argument("--chatter", type=float, default=0,
+                        help="fake messages per second")
+    parser.add_argument("--chatter-lines", type=int, default=1,
+                        help="lines per fake message")
+    parser.add_argument("--fanout", type=int, default=None,
+                        help="most clients each broadcast goes to")
+    parser.add_argument("--slow-read", type=float, default=0,
+                        help="seconds to wait before every read")
+    parser.add_argument("--split-rate", type=float, default=0,
+                        help="chance a frame is written in pieces")
+    parser.add_argument("--drop-rate", type=float, default=0,
+                        help="chance a write drops the connection instead")
+    args = parser.parse_args()
+
+    server = LocalServer(
+        args.host, args.port, not args.no_session, args.zeros, args.chatter,
+        args.chatter_lines, args.fanout, args.slow_read, args.split_rate,
+        args.drop_rate
+    )
+
+    async def run():
+        await server.start()
+        print(f"Local server listening on {server.host}:{server.port}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
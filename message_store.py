@@ -0,0 +1,166 @@
+"""
+message_store.py
+Python Chatroom
+
+Keeps chat messages in a SQLite database, so they're still there next
+    time. Off unless "messageDb" in data.json is a path.
+Messages come in on the event loop, so adding one only puts it in a
+    list. Every interval seconds (or sooner, once there are batch_size
+    of them) the list goes into the database in one transaction, on a
+    worker thread, the same way datastore.py saves data.json.
+The database is in WAL mode, so reading (like reloading the tabs at
+    startup) doesn't wait for writing. It's indexed by (chat, ts), for
+    the newest messages in a chat, and by (username, ts), for
+    everything one person said:
+
+    store = MessageStore("messages.db")
+    for chat, ts, username, kind, text in store.by_user("spammer", since=time.time() - 3600):
+        print(chat, username, text)
+"""
+
+import sqlite3
+import threading
+import time
+
+import connection
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat TEXT NOT NULL,
+    ts REAL NOT NULL,
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_chat_ts ON messages (chat, ts);
+CREATE INDEX IF NOT EXISTS messages_username_ts ON messages (username, ts);
+"""
+
+
+class MessageStore:
+    """
+    Chat messages in a SQLite file.
+    Rows come back as (chat, ts, username, kind, text), where ts is a
+        time.time() and kind is a messages kind (chat or whisper).
+    """
+
+    def __init__(self, path, batch_size=500, interval=1):
+        """
+        MessageStore.__init__(path, batch_size=500, interval=1) -> MessageStore
+        path is the database file; it's made if it isn't there.
+        Messages are written at least every interval seconds, or as soon
+            as batch_size of them are waiting.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.scheduled = False
+        self.lock = threading.Lock()
+        # One connection, used from whichever thread holds db_lock.
+        self.db_lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, this is still safe against crashes, just not power cuts.
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def add(self, chat, username, kind, text, when=None):
+        """
+        MessageStore.add(chat, username, kind, text, when=None)
+        Queues a message to be written. when is a time.time(); now if None.
+        Safe from any thread, and cheap.
+        """
+        when = time.time() if when is None else when
+        with self.lock:
+            self.pending.append((chat, when, username, kind, text))
+            full = len(self.pending) >= self.batch_size
+            if self.scheduled and not full:
+                return
+            self.scheduled = True
+        loop = connection.get_loop()
+        if full:
+            loop.call_soon_threadsafe(self.flush_later)
+        else:
+            loop.call_soon_threadsafe(loop.call_later, self.interval, self.flush_later)
+
+    def flush_later(self):
+        """
+        MessageStore.flush_later()
+        Time to write. The writing happens on a worker thread.
+        """
+        with self.lock:
+            self.scheduled = False
+        connection.get_loop().run_in_executor(None, self.flush)
+
+    def flush(self):
+        """
+        MessageStore.flush()
+        Writes everything waiting, in one transaction. Blocks.
+        """
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return
+        with self.db_lock:
+            try:
+                with metrics.timer("message_store_seconds").time(), self.db:
+                    self.db.executemany(
+                        "INSERT INTO messages (chat, ts, username, kind, text) "
+                        "VALUES (?, ?, ?, ?, ?)", batch)
+            except sqlite3.Error as e:
+                print(f"Could not save messages to {self.path}: {e}")
+
+    def query(self, sql, args):
+        """
+        MessageStore.query(sql, args) -> list
+        Runs a SELECT and returns all the rows.
+        """
+        with self.db_lock:
+            return self.db.execute(sql, args).fetchall()
+
+    def chats(self):
+        """
+        MessageStore.chats() -> list
+        Every chat that has messages.
+        """
+        return [row[0] for row in self.query("SELECT DISTINCT chat FROM messages", ())]
+
+    def recent(self, chat, limit=100):
+        """
+        MessageStore.recent(chat, limit=100) -> list
+        The newest limit messages in a chat, oldest first.
+        """
+        rows = self.query(
+            "SELECT chat, ts, username, kind, text FROM messages "
+            "WHERE chat = ? ORDER BY ts DESC LIMIT ?", (chat, limit))
+        rows.reverse()
+        return rows
+
+    def by_user(self, username, since=None, until=None, limit=1000):
+        """
+        MessageStore.by_user(username, since=None, until=None, limit=1000) -> list
+        The newest limit things username said (in any chat) between since
+            and until (time.time()s; None means no limit), newest first.
+        """
+        return self.query(
+            "SELECT chat, ts, username, kind, text FROM messages "
+            "WHERE username = ? AND ts >= ? AND ts <= ? ORDER BY ts DESC LIMIT ?",
+            (
+                username,
+                since if since is not None else float("-inf"),
+                until if until is not None else float("inf"),
+                limit
+            )
+        )
+
+    def close(self):
+        """
+        MessageStore.close()
+        Writes what's waiting and closes the database.
+        """
+        self.flush()
+        with self.db_lock:
+            self.db.close()
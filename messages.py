@@ -0,0 +1,179 @@
+"""
+messages.py
+Python Chatroom
+
+Turns lines from the server into Message records, once.
+Before this, the network thread worked out what a line was with a chain
+    of startswith() checks, and then the UI split the same line up all
+    over again. Now parse() does it in one go and everybody uses the
+    record.
+
+Kinds of message:
+    CHAT         "username> message", or a line with no username at all
+    WHISPER      "username> /w message", or "me> /w To:someone message"
+    ERROR        "Server> /e message", or "/e delacc message" etc.
+    KICKED       "Server> You have been kicked by someone. "
+    BALANCE      "/balance amount"
+    COOKIES      "/cookies amount"
+    NEW_HASH     "/newHash hash"
+    LEADERBOARD  "/update_leaderboard name,money name,money ..."
+    PING         "/ping ..."
+    COMMAND      any other line starting with "/"
+
+Once a message is shown, what's kept of it is a ChatRecord: who, what,
+    when (whole seconds) and a Kind saying how to show it. The chat
+    views, the history files and the search index all use the same
+    record, so there's only one copy of each message around.
+"""
+
+import enum
+import sys
+import time
+
+CHAT = "chat"
+WHISPER = "whisper"
+ERROR = "error"
+KICKED = "kicked"
+BALANCE = "balance"
+COOKIES = "cookies"
+NEW_HASH = "newHash"
+LEADERBOARD = "leaderboard"
+PING = "ping"
+COMMAND = "command"
+
+# First word of a command line -> kind.
+COMMANDS = {
+    "/balance": BALANCE,
+    "/cookies": COOKIES,
+    "/newHash": NEW_HASH,
+    "/update_leaderboard": LEADERBOARD,
+    "/ping": PING,
+    "/e": ERROR,
+}
+
+
+class Message:
+    """
+    One parsed line.
+    kind is one of the kinds above.
+    username is who said it ("" for commands and bare lines).
+    substance is everything after "username> " (the whole line if
+        there's no username).
+    text is what to show: substance without "/w ", "/e " or "To:someone".
+    target is who we whispered to for "/w To:", or what failed for
+        "/e delacc" and "/e changepass". None otherwise.
+    args is the words after the command, for command lines.
+    """
+
+    def __init__(self, line, kind, username="", substance="", text="", target=None, args=()):
+        """
+        Message.__init__(line, kind, username="", substance="", text="", target=None, args=()) -> Message
+        """
+        self.line = line
+        self.kind = kind
+        self.username = username
+        self.substance = substance
+        self.text = text
+        self.target = target
+        self.args = args
+
+    def __repr__(self):
+        return f"Message({self.kind!r}, {self.line!r})"
+
+
+class Kind(enum.IntEnum):
+    """
+    How a shown message looks (which color it gets), as opposed to the
+        kinds above, which are what a line from the server means.
+    """
+    CHAT = 0
+    WHISPER = 1
+    ERROR = 2
+    OWN = 3
+
+
+class ChatRecord:
+    """
+    One message in a chat, kept as small as it goes.
+    username is interned, so a thousand messages from one person share
+        one string. ts is a whole time.time(), only turned into a date
+        when it's drawn. kind is a Kind.
+    """
+    __slots__ = ("username", "text", "ts", "kind")
+
+    def __init__(self, username, text, kind=Kind.CHAT, ts=None):
+        """
+        ChatRecord.__init__(username, text, kind=Kind.CHAT, ts=None) -> ChatRecord
+        ts defaults to now.
+        """
+        self.username = sys.intern(username)
+        self.text = text
+        self.ts = int(time.time() if ts is None else ts)
+        self.kind = kind
+
+    def pack(self):
+        """
+        ChatRecord.pack() -> list
+        The record as a list, for JSON.
+        """
+        return [self.username, self.text, self.ts, int(self.kind)]
+
+    @classmethod
+    def unpack(cls, packed):
+        """
+        ChatRecord.unpack(packed) -> ChatRecord
+        Undoes pack().
+        """
+        username, text, ts, kind = packed
+        return cls(username, text, Kind(kind), ts)
+
+    def __repr__(self):
+        return f"ChatRecord({self.username!r}, {self.text!r}, {self.kind.name}, {self.ts})"
+
+
+def register_command(command, kind):
+    """
+    register_command(command, kind)
+    Teaches parse() a new server command, like register_command("/foo", "foo").
+    Lines starting with it get that kind; see ChatClient.register for
+        handling them.
+    """
+    COMMANDS[command] = kind
+
+
+def parse(line):
+    """
+    parse(line) -> Message
+    Works out what kind of line it is and pulls out the pieces.
+    """
+    username, arrow, substance = line.partition(">")
+    if arrow:
+        # "username> substance"
+        substance = substance[1:]
+        if substance.startswith("/w "):
+            if substance.startswith("/w To:"):
+                words = substance.split(" ")
+                return Message(
+                    line, WHISPER, username, substance, " ".join(words[2:]),
+                    words[1][3:])
+            return Message(line, WHISPER, username, substance, substance[3:])
+
+        if username == "Server":
+            if substance.startswith("/e "):
+                return Message(line, ERROR, username, substance, substance[3:])
+            if substance.startswith("You have been kicked by ") and substance.endswith(". "):
+                return Message(line, KICKED, username, substance, substance)
+
+        return Message(line, CHAT, username, substance, substance)
+
+    if line.startswith("/"):
+        words = line.split(" ")
+        kind = COMMANDS.get(words[0], COMMAND)
+        if kind == ERROR:
+            # "/e delacc message": what failed, then why.
+            return Message(
+                line, ERROR, "", line, " ".join(words[2:]),
+                words[1] if len(words) > 1 else None, words[1:])
+        return Message(line, kind, "", line, line, None, words[1:])
+
+    return Message(line, CHAT, "", line, line)
@@ -0,0 +1,288 @@
+"""
+metrics.py
+Python Chatroom
+
+Numbers about what the client is doing, so a slow client can tell us
+    where its time goes instead of us guessing from print()s.
+Three kinds:
+    counters    only go up (bytes received, frames, failures...)
+    gauges      a value right now (queue lengths, hash rate...); either
+                    set() them or give them a function to call
+    timers      how long something took, as a histogram.Histogram
+Everything lives in one process-wide registry, and the module-level
+    functions use it:
+
+    metrics.counter("frames_received").inc()
+    with metrics.timer("decrypt_seconds").time():
+        ...
+
+To look at them: snapshot() (a dict), to_json(), to_prometheus() (the
+    Prometheus text format), dump_every(path, seconds) for a JSON file
+    that keeps getting rewritten, or serve(port) for
+    http://127.0.0.1:port/metrics.
+"""
+
+import http.server
+import json
+import os
+import threading
+import time
+
+import histogram
+
+
+class Counter:
+    """
+    A number that only goes up.
+    """
+
+    def __init__(self):
+        """
+        Counter.__init__() -> Counter
+        """
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """
+        Counter.inc(amount=1)
+        """
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        """
+        Counter.get() -> int
+        """
+        return self.value
+
+
+class Gauge:
+    """
+    A number that can go up and down.
+    """
+
+    def __init__(self, function=None):
+        """
+        Gauge.__init__(function=None) -> Gauge
+        If there's a function, it gets called for the value every time
+            somebody looks, and set() doesn't do anything.
+        """
+        self.function = function
+        self.value = 0
+
+    def set(self, value):
+        """
+        Gauge.set(value)
+        """
+        self.value = value
+
+    def get(self):
+        """
+        Gauge.get() -> number
+        """
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return None
+        return self.value
+
+
+class Timer(histogram.Histogram):
+    """
+    A histogram.Histogram of durations that's safe to use from any thread.
+    """
+
+    def __init__(self):
+        """
+        Timer.__init__() -> Timer
+        """
+        self.lock = threading.Lock()
+        histogram.Histogram.__init__(self)
+
+    def record(self, seconds):
+        """
+        Timer.record(seconds)
+        """
+        with self.lock:
+            histogram.Histogram.record(self, seconds)
+
+    def time(self):
+        """
+        Timer.time() -> context manager
+        Records how long the with block took.
+        """
+        return Timing(self)
+
+    def get(self):
+        """
+        Timer.get() -> dict
+        The histogram summary.
+        """
+        with self.lock:
+            return self.summary()
+
+
+class Timing:
+    """
+    What Timer.time() gives you.
+    """
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(time.perf_counter() - self.start)
+
+
+class Registry:
+    """
+    All the metrics, by name.
+    """
+
+    def __init__(self):
+        """
+        Registry.__init__() -> Registry
+        """
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get(self, name, kind, *args):
+        """
+        Registry.get(name, kind, *args) -> metric
+        The metric with that name, made with kind(*args) if it's new.
+        """
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(name, kind(*args))
+        return metric
+
+    def counter(self, name):
+        """
+        Registry.counter(name) -> Counter
+        """
+        return self.get(name, Counter)
+
+    def gauge(self, name, function=None):
+        """
+        Registry.gauge(name, function=None) -> Gauge
+        Giving a function replaces the old one, if there was one.
+        """
+        gauge = self.get(name, Gauge)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def timer(self, name):
+        """
+        Registry.timer(name) -> Timer
+        """
+        return self.get(name, Timer)
+
+    def snapshot(self):
+        """
+        Registry.snapshot() -> dict
+        Every metric's current value. Timers are dicts (see Timer.get).
+        """
+        return {name: metric.get() for name, metric in sorted(self.metrics.items())}
+
+    def to_json(self):
+        """
+        Registry.to_json() -> str
+        """
+        return json.dumps({"time": time.time(), "metrics": self.snapshot()})
+
+    def to_prometheus(self):
+        """
+        Registry.to_prometheus() -> str
+        The Prometheus text format. Timers come out as summaries.
+        """
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            name = f"chatroom_{name}"
+            value = metric.get()
+            if isinstance(metric, Timer):
+                lines.append(f"# TYPE {name} summary")
+                for quantile in ("0.5", "0.95", "0.99"):
+                    key = "p" + str(int(float(quantile) * 100))
+                    if value[key] is not None:
+                        lines.append(f'{name}{{quantile="{quantile}"}} {value[key]}')
+                lines.append(f"{name}_sum {(value['mean'] or 0) * value['count']}")
+                lines.append(f"{name}_count {value['count']}")
+            elif value is not None:
+                kind = "counter" if isinstance(metric, Counter) else "gauge"
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+timer = registry.timer
+snapshot = registry.snapshot
+to_json = registry.to_json
+to_prometheus = registry.to_prometheus
+
+
+def dump_every(path, interval=10):
+    """
+    dump_every(path, interval=10) -> threading.Thread
+    Rewrites path with to_json() every interval seconds, on a daemon thread.
+    """
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(path + ".tmp", "w") as f:
+                    f.write(to_json())
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e}")
+
+    thread = threading.Thread(target=loop, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers GET /metrics with to_prometheus(), and /metrics.json with to_json().
+    """
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, kind = to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, kind = to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", kind)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # Scrapers every few seconds would flood the console.
+        pass
+
+
+def serve(port=9235, host="127.0.0.1"):
+    """
+    serve(port=9235, host="127.0.0.1") -> http.server.HTTPServer
+    Serves the metrics over HTTP, on a daemon thread. Only on localhost
+        unless you say otherwise.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
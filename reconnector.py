@@ -0,0 +1,112 @@
+"""
+reconnector.py
+Python Chatroom
+
+When the server went away, the client used to say "the server has
+    broken down" and close the whole window. Now, if the connection
+    drops (not if we're kicked or hang up ourselves), a Reconnector
+    logs back in: first after about base seconds, then twice as long
+    each time up to cap, with some randomness so a room full of clients
+    doesn't all come back in the same instant after a server restart.
+It logs in with the same keypair and credentials as before. Anything
+    sent while we're away waits in ChatClient's outgoing queue and goes
+    out once we're back.
+"""
+
+import asyncio
+import random
+
+import connection
+
+
+class Reconnector:
+    """
+    Brings one ChatClient back after its connection drops.
+    """
+
+    def __init__(self, client, base=0.5, cap=30, attempts=None):
+        """
+        Reconnector.__init__(client, base=0.5, cap=30, attempts=None) -> Reconnector
+        base and cap are the shortest and longest waits, in seconds.
+        attempts is how many times to try before giving up.
+            None means keep trying.
+        """
+        self.client = client
+        self.base = base
+        self.cap = cap
+        self.attempts = attempts
+        self.enabled = True
+        # True from the connection dropping until we're back (or give up).
+        self.resuming = False
+        self.task = None
+
+    def delay(self, attempt):
+        """
+        Reconnector.delay(attempt) -> float
+        How long to wait before the given try (counting from 0).
+        Somewhere between half and all of base * 2**attempt.
+        """
+        longest = min(self.cap, self.base * 2 ** attempt)
+        return random.uniform(longest / 2, longest)
+
+    def start(self, error):
+        """
+        Reconnector.start(error)
+        The connection dropped. Starts trying to get it back, unless
+            we're already at it. Call on the event loop.
+        """
+        if self.resuming or not self.enabled:
+            return
+        self.resuming = True
+        self.client.emit("connection_lost", error)
+        self.task = asyncio.ensure_future(self.run(error))
+
+    async def run(self, error):
+        """
+        Reconnector.run(error)
+        Logs in again and again until it works or we run out of tries.
+        """
+        client = self.client
+        attempt = 0
+        try:
+            while self.attempts is None or attempt < self.attempts:
+                wait = self.delay(attempt)
+                attempt += 1
+                client.emit("reconnecting", attempt, wait)
+                await asyncio.sleep(wait)
+                try:
+                    ok = await client.login(
+                        *client.last_login, resume=True, hashed=True)
+                except Exception as e:
+                    ok = False
+                    error = e
+                if ok:
+                    self.resuming = False
+                    # The login info has our balance; ask for the hash too,
+                    #     which also sends off whatever was waiting.
+                    client.send("/requestHash")
+                    return
+
+        except asyncio.CancelledError:
+            self.resuming = False
+            raise
+
+        # No luck. Give up for real.
+        self.resuming = False
+        self.enabled = False
+        if client.dead:
+            client.stop_jobs()
+            client.wrap_up(True)
+            client.emit("disconnected", error)
+        else:
+            client.close(error)
+
+    def stop(self):
+        """
+        Reconnector.stop()
+        Stops trying, for good. Safe from any thread.
+        """
+        self.enabled = False
+        self.resuming = False
+        if self.task is not None:
+            connection.get_loop().call_soon_threadsafe(self.task.cancel)
@@ -0,0 +1,203 @@
+"""
+search.py
+Python Chatroom
+
+Searching the chat history.
+Every message gets added to an inverted index as it's shown: for each
+    word (and each username, and each tab) we keep the list of messages
+    that have it, in the order they came. Finding "hello from bob" is
+    then walking the shortest of those lists backwards and checking the
+    others with a binary search, so it doesn't matter how many millions
+    of messages there are, and adding one never means looking at the
+    old ones again.
+Lists are arrays of ints, 4 bytes a message per word, and messages are
+    numbered in the order they came, so a time range is a binary search
+    too. The messages themselves aren't kept here; they're the same
+    messages.ChatRecords the chat tabs have.
+
+Queries are words, plus any of:
+    from:username   only things that person said
+    in:tab          only that chat tab
+    since:10m       only the last 10 minutes (s, m, h, d or w)
+    before:2h       only things older than 2 hours
+"""
+
+import array
+import bisect
+import re
+import time
+
+WORD = re.compile(r"\w+")
+# since:/before: units, in seconds.
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def tokenize(text):
+    """
+    tokenize(text) -> list
+    The words in text, lowercase.
+    """
+    return WORD.findall(text.casefold())
+
+
+def parse_duration(text):
+    """
+    parse_duration(text) -> float
+    "10m" -> 600. A bare number is seconds. None if it doesn't make sense.
+    """
+    unit = UNITS.get(text[-1:].lower())
+    number = text[:-1] if unit else text
+    try:
+        return float(number) * (unit or 1)
+    except ValueError:
+        return None
+
+
+def parse_query(query, now=None):
+    """
+    parse_query(query, now=None) -> dict
+    Splits a query into the keyword arguments SearchIndex.search takes:
+        words, username, tab, since and until.
+    """
+    now = time.time() if now is None else now
+    options = {"words": [], "username": None, "tab": None, "since": None, "until": None}
+    for part in query.split():
+        name, colon, value = part.partition(":")
+        name = name.lower()
+        if colon and value and name == "from":
+            options["username"] = value
+        elif colon and value and name == "in":
+            options["tab"] = value
+        elif colon and value and name in ("since", "before"):
+            seconds = parse_duration(value)
+            if seconds is not None:
+                options["since" if name == "since" else "until"] = now - seconds
+        else:
+            options["words"].extend(tokenize(part))
+    return options
+
+
+class SearchIndex:
+    """
+    An inverted index over chat messages.
+    A message is found by its tab and its number in that tab's history
+        (what ChatView.see takes).
+    """
+
+    def __init__(self):
+        """
+        SearchIndex.__init__() -> SearchIndex
+        """
+        # For message number n: its tab, its number in that tab, and when.
+        self.tabs = array.array("I")
+        self.positions = array.array("Q")
+        self.times = array.array("q")
+        # Tabs and usernames get numbers, so postings can be arrays.
+        self.tab_ids = {}
+        self.tab_names = []
+        # word, or username/tab key -> array of message numbers.
+        self.words = {}
+        self.users = {}
+        self.chats = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    @staticmethod
+    def post(postings, key, number):
+        """
+        SearchIndex.post(postings, key, number)
+        Adds message number to the list for key.
+        """
+        found = postings.get(key)
+        if found is None:
+            found = postings[key] = array.array("I")
+        found.append(number)
+
+    def add(self, tab, position, record):
+        """
+        SearchIndex.add(tab, position, record)
+        Indexes one messages.ChatRecord, message number position in tab.
+        Times should only go forward; it's fine if they don't, but
+            since/before searches will be a little off.
+        """
+        when = record.ts
+        if self.times and when < self.times[-1]:
+            when = self.times[-1]
+        tab_id = self.tab_ids.get(tab)
+        if tab_id is None:
+            tab_id = self.tab_ids[tab] = len(self.tab_names)
+            self.tab_names.append(tab)
+
+        number = len(self.times)
+        self.tabs.append(tab_id)
+        self.positions.append(position)
+        self.times.append(when)
+        for word in set(tokenize(record.text)):
+            self.post(self.words, word, number)
+        if record.username:
+            self.post(self.users, record.username.casefold(), number)
+        self.post(self.chats, tab_id, number)
+
+    def search(self, words=(), username=None, tab=None, since=None, until=None, limit=100):
+        """
+        SearchIndex.search(words=(), username=None, tab=None, since=None, until=None, limit=100) -> list
+        The newest limit messages that have every word, and are from
+            username, in tab and between since and until (time.time()s),
+            for whichever of those aren't None.
+        Each one is (tab, position, when), when being a whole time.time().
+        """
+        lists = [self.words.get(word) for word in set(words)]
+        if username is not None:
+            lists.append(self.users.get(username.casefold()))
+        if tab is not None:
+            tab_id = self.tab_ids.get(tab)
+            lists.append(self.chats.get(tab_id) if tab_id is not None else None)
+        if any(found is None for found in lists):
+            # A word nobody has said; nothing can match.
+            return []
+
+        # Messages are numbered in time order, so the time range is a
+        #     range of numbers.
+        low = bisect.bisect_left(self.times, since) if since is not None else 0
+        high = bisect.bisect_right(self.times, until) if until is not None else len(self.times)
+        if not lists:
+            # Only a time range: everything in it.
+            return [
+                self.result(number)
+                for number in range(high - 1, max(low, high - limit) - 1, -1)
+            ]
+
+        lists.sort(key=len)
+        shortest, others = lists[0], lists[1:]
+        start = bisect.bisect_left(shortest, low)
+        index = bisect.bisect_left(shortest, high) - 1
+        results = []
+        while index >= start and len(results) < limit:
+            number = shortest[index]
+            if all(self.has(found, number) for found in others):
+                results.append(self.result(number))
+            index -= 1
+        return results
+
+    def query(self, query, limit=100):
+        """
+        SearchIndex.query(query, limit=100) -> list
+        search(), with a query like "hello from:bob since:1h" (see the top).
+        """
+        return self.search(limit=limit, **parse_query(query))
+
+    @staticmethod
+    def has(found, number):
+        """
+        SearchIndex.has(found, number) -> bool
+        Whether a sorted list of message numbers has number in it.
+        """
+        index = bisect.bisect_left(found, number)
+        return index < len(found) and found[index] == number
+
+    def result(self, number):
+        """
+        SearchIndex.result(number) -> (tab, position, when)
+        """
+        return self.tab_names[self.tabs[number]], self.positions[number], self.times[number]
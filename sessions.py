@@ -0,0 +1,182 @@
+"""
+sessions.py
+Python Chatroom
+
+Lots of accounts, one process, no windows.
+Every ChatClient already runs on the shared event loop in connection.py,
+    so holding a bunch of them open costs one socket each and nothing
+    else. SessionManager keeps track of them: it logs them all in at
+    once, gives each one a send and a receive, and hangs them all up.
+
+    manager = SessionManager("127.0.0.1")
+    manager.login_all([("mod", "pass1"), ("scraper", "pass2")])
+    manager.send("mod", "/active")
+    print(manager.recv("mod", timeout=5))
+
+All the sessions share one RSA keypair (so it's only made once) and the
+    AES backend picked in encryption.py. Each connection still has its
+    own FrameDecoder, since each one has its own half-received frame.
+"""
+
+import asyncio
+import collections
+import threading
+
+import rsa
+
+import chat_client
+import connection
+
+
+class Inbox:
+    """
+    Events for one session, for whoever calls SessionManager.recv.
+    Keeps the newest size events if nobody reads them.
+    """
+
+    def __init__(self, size=10000):
+        """
+        Inbox.__init__(size=10000) -> Inbox
+        """
+        self.events = collections.deque(maxlen=size)
+        self.ready = threading.Condition()
+
+    def put(self, *event):
+        """
+        Inbox.put(*event)
+        A ChatClient listener.
+        """
+        with self.ready:
+            self.events.append(event)
+            self.ready.notify()
+
+    def get(self, timeout=None):
+        """
+        Inbox.get(timeout=None) -> tuple
+        The oldest event, waiting up to timeout seconds for one.
+        None if there wasn't one in time.
+        """
+        with self.ready:
+            if not self.ready.wait_for(lambda: self.events, timeout):
+                return None
+            return self.events.popleft()
+
+
+class SessionManager:
+    """
+    Keeps several accounts logged in to the same server.
+    """
+
+    def __init__(self, ip, port=1235, keys=None, inbox_size=10000, reconnect=False):
+        """
+        SessionManager.__init__(ip, port=1235, keys=None, inbox_size=10000, reconnect=False) -> SessionManager
+        keys is the (public, private) RSA keypair every session uses.
+            Without one, we make one.
+        inbox_size is how many unread events each session keeps for recv.
+        reconnect says whether sessions log back in when they drop.
+        """
+        self.ip = ip
+        self.port = port
+        self.keys = keys if keys is not None else rsa.newkeys(256)
+        self.inbox_size = inbox_size
+        self.reconnect = reconnect
+        self.sessions = {}
+        self.inboxes = {}
+
+    async def login(self, username, password, new=False, mine=False):
+        """
+        SessionManager.login(username, password, new=False, mine=False) -> bool
+        Logs one account in (or makes it, if new) and keeps it.
+        Only one session should mine; they'd all be after the same hash.
+        """
+        client = chat_client.ChatClient(
+            self.port, keys=self.keys, mine=mine, reconnect=self.reconnect)
+        inbox = Inbox(self.inbox_size)
+        client.add_listener(inbox.put)
+        if new:
+            ok = await client.make_account(self.ip, username, password)
+        else:
+            ok = await client.login(self.ip, username, password)
+        if ok:
+            old = self.sessions.get(username)
+            if old is not None:
+                old.close()
+            self.sessions[username] = client
+            self.inboxes[username] = inbox
+        return ok
+
+    async def login_many(self, accounts):
+        """
+        SessionManager.login_many(accounts) -> dict
+        Logs in every (username, password) pair at the same time.
+        Returns {username: whether it worked}.
+        """
+        accounts = list(accounts)
+        results = await asyncio.gather(
+            *(self.login(username, password) for username, password in accounts),
+            return_exceptions=True
+        )
+        return {
+            username: result is True
+            for (username, _), result in zip(accounts, results)
+        }
+
+    def login_all(self, accounts, timeout=60):
+        """
+        SessionManager.login_all(accounts, timeout=60) -> dict
+        login_many, for code that isn't on the event loop.
+        """
+        return connection.run(self.login_many(accounts), timeout)
+
+    def get(self, username):
+        """
+        SessionManager.get(username) -> ChatClient
+        The session for that account, for anything not covered here.
+        Raises KeyError if it isn't logged in.
+        """
+        return self.sessions[username]
+
+    def send(self, username, message):
+        """
+        SessionManager.send(username, message)
+        Sends a message as that account. Safe from any thread.
+        """
+        self.sessions[username].send(message)
+
+    def recv(self, username, timeout=None):
+        """
+        SessionManager.recv(username, timeout=None) -> tuple
+        The next event for that account (see chat_client.py for events),
+            or None if nothing came within timeout seconds.
+        Blocks, so don't call it on the event loop; use
+            get(username).events() there instead.
+        """
+        return self.inboxes[username].get(timeout)
+
+    def active(self):
+        """
+        SessionManager.active() -> list
+        Usernames of sessions that are still connected.
+        """
+        return [
+            username for username, client in self.sessions.items()
+            if not client.dead
+        ]
+
+    def close(self, username):
+        """
+        SessionManager.close(username)
+        Hangs up one session and forgets it.
+        """
+        client = self.sessions.pop(username, None)
+        self.inboxes.pop(username, None)
+        if client is not None:
+            client.close()
+
+    def close_all(self):
+        """
+        SessionManager.close_all()
+        Hangs up every session.
+        """
+        for username in list(self.sessions):
+            self.close(username)
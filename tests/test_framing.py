@@ -0,0 +1,55 @@
+"""
+test_framing.py
+Python Chatroom
+
+Run with python -m pytest (or python -m unittest discover tests).
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import framing
+
+DELIMITER = framing.DELIMITER
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def feed_in_pieces(self, data, size):
+        decoder = framing.FrameDecoder()
+        frames = []
+        for start in range(0, len(data), size):
+            frames += decoder.feed(data[start:start + size])
+        self.assertEqual(decoder.pending(), 0)
+        return frames
+
+    def test_frame_starting_with_newline(self):
+        # An RSA header starts with 0x0a about 1% of the time; that newline
+        #     belongs to its own frame, not the one before.
+        frames = [b"first", b"\nsecond", b"\n\nthird"]
+        data = b"".join(frame + DELIMITER for frame in frames)
+        self.assertEqual(framing.FrameDecoder().feed(data), frames)
+        for size in range(1, 12):
+            self.assertEqual(self.feed_in_pieces(data, size), frames)
+
+    def test_random_clean_frames(self):
+        frames = []
+        while len(frames) < 300:
+            frame = os.urandom(1 + len(frames) % 40)
+            if framing.is_clean(frame) and DELIMITER not in frame:
+                frames.append(frame)
+        data = b"".join(frame + DELIMITER for frame in frames)
+        self.assertEqual(framing.FrameDecoder().feed(data), frames)
+        for size in (1, 2, 3, 5, 7, 10, 64):
+            self.assertEqual(self.feed_in_pieces(data, size), frames)
+
+    def test_is_clean(self):
+        self.assertTrue(framing.is_clean(b"\nfine"))
+        self.assertFalse(framing.is_clean(b"not fine\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
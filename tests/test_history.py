@@ -0,0 +1,58 @@
+"""
+test_history.py
+Python Chatroom
+
+Run with python -m pytest (or python -m unittest discover tests).
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+import messages
+
+
+class ChatHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "chat.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fill(self, store, start, count):
+        for number in range(start, start + count):
+            store.append(messages.ChatRecord("someone", f"message {number}", ts=number))
+
+    def test_partial_block_keeps_growing(self):
+        # Reading the newest spilled block while it's only half full, then
+        #     spilling more into it, used to give IndexError.
+        store = history.ChatHistory(self.path, cap=10, block_size=8)
+        self.fill(store, 0, 20)
+        self.assertEqual(store.get(9).text, "message 9")
+        self.fill(store, 20, 5)
+        self.assertEqual(store.get(12).text, "message 12")
+        # ...and it's still cached, grown rather than read again.
+        self.assertEqual(len(store.cache[1]), 7)
+        for number in range(25):
+            self.assertEqual(store.get(number).text, f"message {number}")
+        store.close()
+
+    def test_full_blocks_come_back(self):
+        store = history.ChatHistory(self.path, cap=4, block_size=3, cached_blocks=1)
+        self.fill(store, 0, 30)
+        for number in (0, 25, 3, 29, 14):
+            record = store.get(number)
+            self.assertEqual((record.text, record.ts), (f"message {number}", number))
+        self.assertIsNone(store.get(30))
+        store.close()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()